@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from ..analysis import AnalysisJob, split_tiles, tile_label_tables
+from ..scheduler import TaskScheduler
+
+
+def double(tile: np.ndarray) -> np.ndarray:
+    return tile * 2
+
+
+def nonzero(tile: np.ndarray) -> np.ndarray:
+    return np.argwhere(tile)
+
+
+def columns(tile: np.ndarray) -> np.ndarray:
+    """Label the foreground of every x column, numbered from 1 in every tile."""
+    return np.where(tile > 0, np.arange(1, tile.shape[-1] + 1), 0).astype(np.int32)
+
+
+def fail(tile: np.ndarray) -> np.ndarray:
+    raise ValueError('broken tile')
+
+
+@pytest.fixture
+def volume():
+    return np.arange(8 * 10 * 12, dtype=np.float32).reshape(8, 10, 12)
+
+
+@pytest.fixture
+def scheduler(qtbot):
+    scheduler = TaskScheduler(max_workers=2, max_processes=2)
+    yield scheduler
+    scheduler.shutdown(wait=True)
+
+
+def test_split_tiles():
+    tiles = split_tiles((8, 10, 12), 4, 10 * 12 * 4 * 3)
+    assert [t[0] for t in tiles] == [slice(0, 3), slice(3, 6), slice(6, 8)]
+    assert all(t[1:] == (slice(0, 10), slice(0, 12)) for t in tiles)
+    # at least one plane per tile
+    assert len(split_tiles((8, 10, 12), 4, 1)) == 8
+
+
+@pytest.mark.parametrize('memmap', [False, True])
+def test_image_output(qtbot, tmp_path, scheduler: TaskScheduler, volume, memmap):
+    slices = (slice(1, 7), slice(2, 10), slice(0, 5))
+    # one plane per tile, two tiles in flight
+    job = AnalysisJob(
+        double, volume, slices, max_tiles=2, tile_bytes=8 * 5 * 4, memmap_dir=tmp_path if memmap else None
+    )
+    progress = []
+    job.progress.connect(lambda done, total: progress.append((done, total)))
+    with qtbot.waitSignal(job.finished, timeout=30000) as blocker:
+        job.start(scheduler)
+    result = blocker.args[0]
+    assert len(job._slots) == 0
+    assert isinstance(result, np.memmap)
+    np.testing.assert_array_equal(result, volume[slices] * 2)
+    assert progress[-1] == (6, 6)
+    if memmap:
+        assert not list(tmp_path.iterdir())
+
+
+def test_points_output(qtbot, scheduler: TaskScheduler):
+    data = np.zeros((2, 6, 4, 4))
+    data[1, 4, 2, 3] = 1
+    data[1, 1, 1, 1] = 1
+    # three planes per tile, points are returned in region coordinates
+    job = AnalysisJob(
+        nonzero, data, (1, slice(0, 6), slice(0, 4), slice(0, 4)), output='points', tile_bytes=4 * 4 * 8 * 3
+    )
+    with qtbot.waitSignal(job.finished, timeout=30000) as blocker:
+        job.start(scheduler)
+    assert sorted(map(tuple, blocker.args[0].tolist())) == [(1, 1, 1), (4, 2, 3)]
+
+
+def test_tile_label_tables():
+    # one plane per tile, label 1 of the first two tiles touches across the border
+    out = np.array([[[1, 0, 2]], [[1, 1, 0]], [[0, 0, 1]]])
+    tables = tile_label_tables(out, split_tiles(out.shape, 1, 3), [2, 1, 1])
+    assert [table.tolist() for table in tables] == [[0, 1, 2], [0, 1], [0, 3]]
+
+
+def test_labels_output(qtbot, scheduler: TaskScheduler):
+    data = np.zeros((6, 4, 5), dtype=np.uint8)
+    data[:, :, 0] = 1
+    data[:, :, 2] = 1
+    # two objects in the same column, separated along z
+    data[0, :, 4] = 1
+    data[5, :, 4] = 1
+    # one plane per tile
+    job = AnalysisJob(columns, data, (slice(0, 6), slice(0, 4), slice(0, 5)), output='labels', tile_bytes=4 * 5)
+    with qtbot.waitSignal(job.finished, timeout=30000) as blocker:
+        job.start(scheduler)
+    result = blocker.args[0]
+    assert job.done_tiles == job.total == 12
+    # objects crossing slab borders keep one ID, separated objects get their own
+    assert len(np.unique(result[:, :, 0])) == len(np.unique(result[:, :, 2])) == 1
+    assert len({result[0, 0, 0], result[0, 0, 2], result[0, 0, 4], result[5, 0, 4]}) == 4
+    assert len(np.unique(result)) == 5
+
+
+def test_failure(qtbot, scheduler: TaskScheduler, volume):
+    job = AnalysisJob(fail, volume, (slice(0, 8),) * 3, tile_bytes=1)
+    with qtbot.waitSignal(job.failed, timeout=30000) as blocker:
+        job.start(scheduler)
+    assert 'broken tile' in blocker.args[0]
+    qtbot.waitUntil(lambda: job._released, timeout=30000)
+
+
+def test_cancel(qtbot, scheduler: TaskScheduler, volume):
+    job = AnalysisJob(double, volume, (slice(0, 8),) * 3, tile_bytes=1)
+    results = []
+    job.finished.connect(results.append)
+    job.start(scheduler)
+    job.cancel()
+    assert job.cancelled
+    # running tiles finish, then the buffers are released
+    qtbot.waitUntil(lambda: job._released, timeout=30000)
+    assert not results
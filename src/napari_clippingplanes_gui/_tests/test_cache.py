@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+
+from ..cache import ArtifactCache, dataset_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    yield ArtifactCache(str(tmp_path / 'cache'), max_bytes=10000)
+
+
+def test_dataset_key(tmp_path):
+    data = np.arange(10)
+    assert dataset_key(data) == dataset_key(data.copy())
+    assert dataset_key(data) != dataset_key(data + 1)
+    path = tmp_path / 'data.npy'
+    np.save(path, data)
+    key = dataset_key(data, str(path))
+    assert key == dataset_key(data, str(path))
+    np.save(path, data + 1)
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10 ** 9))
+    assert key != dataset_key(data, str(path))
+
+
+def test_dataset_key_directory(tmp_path):
+    store = tmp_path / 'volume.zarr'
+    (store / '0').mkdir(parents=True)
+    (store / '.zarray').write_text('{"chunks": [4]}')
+    chunk = store / '0' / '0'
+    chunk.write_bytes(b'abcd')
+    data = np.zeros(8)
+    key = dataset_key(data, str(store))
+    assert key == dataset_key(data, str(store))
+    # rewriting a chunk does not touch the top-level directory, but changes the key
+    mtime = store.stat().st_mtime_ns
+    chunk.write_bytes(b'efgh')
+    os.utime(chunk, ns=(chunk.stat().st_atime_ns, chunk.stat().st_mtime_ns + 10 ** 9))
+    assert store.stat().st_mtime_ns == mtime
+    assert key != dataset_key(data, str(store))
+    # so does changed metadata
+    key = dataset_key(data, str(store))
+    (store / '.zarray').write_text('{"chunks": [2]}')
+    assert key != dataset_key(data, str(store))
+
+
+def test_get_or_compute(cache: ArtifactCache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.arange(100)
+
+    first = cache.get_or_compute('dataset', 'profile', compute)
+    second = cache.get_or_compute('dataset', 'profile', compute)
+    assert len(calls) == 1
+    assert isinstance(second, np.memmap)
+    np.testing.assert_array_equal(first, second)
+    # a new instance reuses the artifacts on disk
+    reopened = ArtifactCache(cache.root, max_bytes=cache.max_bytes)
+    np.testing.assert_array_equal(reopened.get('dataset', 'profile'), np.arange(100))
+
+
+def test_lru_eviction(cache: ArtifactCache):
+    for name in ('a', 'b', 'c'):
+        cache.put('dataset', name, np.zeros(400))
+    cache.get('dataset', 'a')
+    cache.put('dataset', 'd', np.zeros(400))
+    assert cache.nbytes <= cache.max_bytes
+    assert cache.get('dataset', 'b') is None
+    assert cache.get('dataset', 'a') is not None
+
+
+def test_invalidate(cache: ArtifactCache):
+    cache.put('dataset', 'a', np.zeros(10))
+    cache.put('dataset', 'b', np.zeros(10))
+    cache.invalidate('dataset', 'a')
+    assert cache.get('dataset', 'a') is None
+    cache.invalidate('dataset')
+    assert cache.get('dataset', 'b') is None
+    assert cache.nbytes == 0
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from ..chunks import chunk_boundaries, estimate_io, snap_range
+
+da = pytest.importorskip('dask.array')
+
+
+def test_chunk_boundaries():
+    assert chunk_boundaries(np.zeros((4, 4))) is None
+    grid = chunk_boundaries(da.zeros((10, 7), chunks=((4, 6), (3, 3, 1))))
+    np.testing.assert_array_equal(grid[0], [0, 4, 10])
+    np.testing.assert_array_equal(grid[1], [0, 3, 6, 7])
+
+
+def test_snap_range():
+    bounds = np.array([0, 16, 32, 48, 50])
+    assert snap_range(17, 40, bounds, 'outward') == (16, 48)
+    assert snap_range(10, 40, bounds, 'inward') == (16, 32)
+    assert snap_range(16, 32, bounds, 'outward') == (16, 32)
+    # no whole chunk inside, inward falls back to outward
+    assert snap_range(18, 30, bounds, 'inward') == (16, 32)
+    assert snap_range(0, 50, bounds, 'inward') == (0, 50)
+
+
+def test_estimate_io():
+    grid = chunk_boundaries(da.zeros((4, 64, 64), chunks=(1, 16, 16)))
+    assert estimate_io(grid, (2, slice(0, 16), slice(0, 64)), 2) == (4, 16 * 64 * 2)
+    # one voxel past a chunk border reads a whole extra row of chunks
+    assert estimate_io(grid, (2, slice(0, 17), slice(0, 64)), 2) == (8, 32 * 64 * 2)
+    assert estimate_io(grid, (slice(0, 4), slice(5, 5), slice(0, 64)), 2) == (0, 0)
@@ -0,0 +1,106 @@
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from ..control_server import ControlClient, merge_commands
+from ..utils import CPManager
+from ..widgets import ClippingSliderWidget
+
+
+@pytest.fixture
+def cpmanager(make_napari_viewer):
+    nv = make_napari_viewer()
+    nv.add_image(np.zeros((10, 100, 100)), name='3D')
+    sliders = [ClippingSliderWidget('x'), ClippingSliderWidget('y'), ClippingSliderWidget('z')]
+    manager = CPManager(nv, dict(z=(0, 0), y=(2, 1), x=(4, 2)), sliders)
+    yield manager
+    manager.stop_control_server()
+
+
+def run_client(address, target, results):
+    def run():
+        with ControlClient(address) as client:
+            results['reply'] = target(client)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_merge_commands():
+    commands = [
+        dict(cmd='set_box', axis='x', value=[0, 10]),
+        dict(cmd='set_box', axis='y', value=[0, 10]),
+        dict(cmd='set_box', axis='x', value=[5, 20]),
+        dict(cmd='query'),
+        dict(cmd='set_box', axis='x', value=[6, 30]),
+    ]
+    merged = merge_commands(commands)
+    assert merged == [commands[1], commands[2], commands[3], commands[4]]
+
+
+def test_round_trip(qtbot, cpmanager: CPManager):
+    server = cpmanager.start_control_server()
+    results = {}
+
+    def target(client):
+        client.send([dict(cmd='set_box', axis='y', value=[10, 20]), dict(cmd='toggle_axis', axis='y', state=True)])
+        start = time.perf_counter()
+        reply = client.query()
+        results['latency'] = time.perf_counter() - start
+        return reply
+
+    thread = run_client(server.address, target, results)
+    qtbot.waitUntil(lambda: 'reply' in results, timeout=5000)
+    thread.join()
+    assert results['reply']['ok']
+    assert results['reply']['state']['sliders']['y'] == dict(state=True, value=[10, 20])
+    assert cpmanager.sliders['y'].value == (10, 20)
+    assert results['latency'] < 0.5
+
+
+def test_unknown_command(qtbot, cpmanager: CPManager):
+    server = cpmanager.start_control_server()
+    results = {}
+    thread = run_client(server.address, lambda client: client.query([dict(cmd='explode')]), results)
+    qtbot.waitUntil(lambda: 'reply' in results, timeout=5000)
+    thread.join()
+    assert not results['reply']['ok']
+    assert 'unknown command' in results['reply']['errors'][0]
+
+
+@pytest.mark.parametrize('message', [5, [5], [dict(cmd='query'), 'query']])
+def test_invalid_message(qtbot, cpmanager: CPManager, message):
+    server = cpmanager.start_control_server()
+    results = {}
+
+    def target(client):
+        client.send(message)
+        return client.query(), client.query()
+
+    thread = run_client(server.address, target, results)
+    qtbot.waitUntil(lambda: 'reply' in results, timeout=5000)
+    thread.join()
+    invalid, reply = results['reply']
+    assert not invalid['ok']
+    assert 'invalid message' in invalid['error']
+    # the connection survives the invalid message
+    assert reply['ok']
+
+
+def test_stale_unix_socket(qtbot, cpmanager: CPManager, tmp_path):
+    if not hasattr(socket, 'AF_UNIX'):
+        pytest.skip('Unix sockets are not supported on this platform')
+    path = str(tmp_path / 'control.sock')
+    # a crashed server leaves its socket file behind
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    server = cpmanager.start_control_server(path)
+    results = {}
+    thread = run_client(server.address, lambda client: client.query(), results)
+    qtbot.waitUntil(lambda: 'reply' in results, timeout=5000)
+    thread.join()
+    assert results['reply']['ok']
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from pytestqt import qtbot
 
@@ -11,3 +12,54 @@ def clipping_widget(qtbot: qtbot, make_napari_viewer):
 
 def test_clipping_widget(clipping_widget: ImgClipperWidget):
     assert len(clipping_widget.findChildren(ClippingSliderWidget)) == 3
+
+
+def test_presets(clipping_widget: ImgClipperWidget):
+    clipping_widget.preset_combo.setEditText('cut')
+    clipping_widget.y_clipping_slider.set_value((10, 20))
+    clipping_widget.save_preset()
+    assert 'cut' in clipping_widget.clipping_plane_manager.presets
+    clipping_widget.y_clipping_slider.set_value((0, 100))
+    clipping_widget.preset_selected(clipping_widget.preset_combo.findText('cut'))
+    assert clipping_widget.y_clipping_slider.value == (10, 20)
+    clipping_widget.remove_preset()
+    assert not clipping_widget.clipping_plane_manager.presets
+
+
+def test_analysis_action(clipping_widget: ImgClipperWidget):
+    clipping_widget.register_analysis('absolute', abs, output='image')
+    assert clipping_widget.analysis_combo.findText('absolute') == 0
+    assert 'absolute' in clipping_widget.clipping_plane_manager.analysis_functions
+    clipping_widget.cancel_analysis()
+    assert clipping_widget.analysis_progress.value() == 0
+
+
+def test_io_estimate(qtbot, clipping_widget: ImgClipperWidget):
+    da = pytest.importorskip('dask.array')
+    assert clipping_widget.io_label.text() == 'chunk reads: -'
+    clipping_widget.viewer.add_image(da.zeros((8, 64, 64), chunks=(8, 32, 32)))
+    # the label is updated once control returns to the event loop
+    qtbot.waitUntil(lambda: clipping_widget.io_label.text().startswith('chunk reads: 4 ('), timeout=1000)
+    clipping_widget.chunk_snap_combo.setCurrentIndex(1)
+    assert clipping_widget.clipping_plane_manager.chunk_snap == 'outward'
+
+
+def test_bulk_insert(qtbot, clipping_widget: ImgClipperWidget):
+    assert clipping_widget.clipping_plane_manager.bulk_insert
+    for i in range(3):
+        clipping_widget.viewer.add_image(np.zeros((4, 8, 8)), name=f'tile_{i}')
+    assert not clipping_widget.viewer.layers['tile_0'].experimental_clipping_planes
+    qtbot.waitUntil(
+        lambda: all(layer.experimental_clipping_planes for layer in clipping_widget.viewer.layers), timeout=1000
+    )
+
+
+def test_close_on_destroy(qtbot, make_napari_viewer):
+    viewer = make_napari_viewer()
+    widget = ImgClipperWidget(viewer)
+    manager = widget.clipping_plane_manager
+    widget.deleteLater()
+    qtbot.waitUntil(lambda: manager._closed, timeout=1000)
+    layer = viewer.add_image(np.zeros((4, 8, 8)))
+    qtbot.wait(10)
+    assert not layer.experimental_clipping_planes
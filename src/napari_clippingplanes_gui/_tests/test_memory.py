@@ -0,0 +1,83 @@
+import pytest
+
+from ..memory import MemoryBudget
+
+
+@pytest.fixture
+def budget():
+    budget = MemoryBudget(budget_bytes=100)
+    budget.evicted = []
+    budget.register('a', lambda layer, item: budget.evicted.append(('a', layer, item)))
+    budget.register('b', lambda layer, item: budget.evicted.append(('b', layer, item)))
+    return budget
+
+
+def test_lru_eviction(budget: MemoryBudget):
+    budget.add('a', 1, 'x', 40)
+    budget.add('b', 1, 'y', 40)
+    budget.touch('a', 1, 'x')
+    budget.add('a', 2, 'z', 40)
+    assert budget.evicted == [('b', 1, 'y')]
+    assert budget.nbytes == 80
+
+
+def test_cost_aware_eviction(budget: MemoryBudget):
+    # the expensive item survives although it is older
+    budget.add('a', 1, 'expensive', 40, cost=1000)
+    budget.add('b', 1, 'cheap', 40, cost=1)
+    budget.add('b', 2, 'new', 40)
+    assert budget.evicted == [('b', 1, 'cheap')]
+
+
+def test_release_layer(budget: MemoryBudget):
+    budget.add('a', 1, 'x', 10)
+    budget.add('b', 1, 'y', 10)
+    budget.add('b', 2, 'z', 10)
+    budget.release_layer(1)
+    assert sorted(budget.evicted) == [('a', 1, 'x'), ('b', 1, 'y')]
+    usage = budget.usage()
+    assert usage['nbytes'] == 10
+    assert usage['caches'] == dict(a=0, b=10)
+    assert usage['layers'] == {2: 10}
+
+
+def test_set_budget(budget: MemoryBudget):
+    calls = []
+    budget.listeners.append(lambda: calls.append(1))
+    budget.add('a', 1, 'x', 40)
+    budget.add('a', 2, 'x', 40)
+    budget.set_budget(50)
+    assert budget.evicted == [('a', 1, 'x')]
+    assert len(calls) == 3
+
+
+def test_cache_budget(budget: MemoryBudget):
+    budget.set_cache_budget('a', 50)
+    budget.add('a', 1, 'x', 30)
+    budget.add('b', 1, 'y', 30)
+    budget.add('a', 2, 'x', 30)
+    # only items of the capped cache are evicted although the other one is older
+    assert budget.evicted == [('a', 1, 'x')]
+    budget.set_cache_budget('a', None)
+    budget.add('a', 3, 'x', 50)
+    assert budget.evicted == [('a', 1, 'x'), ('b', 1, 'y')]
+
+
+def test_register_cache_budget(budget: MemoryBudget):
+    budget.register('c', lambda layer, item: budget.evicted.append(('c', layer, item)), max_bytes=10)
+    budget.add('c', 1, 'x', 5)
+    budget.add('c', 2, 'x', 10)
+    assert budget.evicted == [('c', 1, 'x')]
+    assert budget.usage()['caches']['c'] == 10
+
+
+def test_accounted_cache(budget: MemoryBudget):
+    budget.register('tables', None)
+    budget.add('tables', 1, None, 60)
+    budget.add('a', 1, 'x', 30)
+    budget.add('a', 2, 'x', 30)
+    # items of caches without an evict callback count towards the budget but are never evicted
+    assert budget.evicted == [('a', 1, 'x')]
+    assert budget.usage()['caches']['tables'] == 60
+    budget.release_layer(1)
+    assert budget.usage()['caches']['tables'] == 0
@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from ..scheduler import INTERACTIVE, SPECULATIVE, TaskScheduler
+
+
+@pytest.fixture
+def scheduler(qtbot):
+    scheduler = TaskScheduler(max_workers=1)
+    yield scheduler
+    scheduler.shutdown(wait=True)
+
+
+def block(scheduler: TaskScheduler) -> threading.Event:
+    """Occupy the single worker until the returned event is set."""
+    release = threading.Event()
+    scheduler.submit(release.wait, 5)
+    return release
+
+
+def test_result_in_main_thread(qtbot, scheduler: TaskScheduler):
+    results = []
+    scheduler.submit(sum, [1, 2, 3], callback=lambda r: results.append((r, threading.current_thread())))
+    qtbot.waitUntil(lambda: len(results) == 1, timeout=1000)
+    assert results == [(6, threading.main_thread())]
+
+
+def test_priorities(qtbot, scheduler: TaskScheduler):
+    order = []
+    release = block(scheduler)
+    scheduler.submit(lambda: 'speculative', priority=SPECULATIVE, callback=order.append)
+    scheduler.submit(lambda: 'interactive', priority=INTERACTIVE, callback=order.append)
+    assert scheduler.metrics()['queue_depth'] == 2
+    release.set()
+    qtbot.waitUntil(lambda: len(order) == 2, timeout=1000)
+    assert order == ['interactive', 'speculative']
+
+
+def test_deduplication(qtbot, scheduler: TaskScheduler):
+    release = block(scheduler)
+    first = scheduler.submit(sum, [1], key='profile')
+    second = scheduler.submit(sum, [2], key='profile')
+    assert first is second
+    release.set()
+    qtbot.waitUntil(lambda: first.done, timeout=1000)
+    assert first.result == 1
+
+
+def test_box_bound_cancellation(qtbot, scheduler: TaskScheduler):
+    results = []
+    release = block(scheduler)
+    stale = scheduler.submit(sum, [1], box_bound=True, callback=results.append)
+    scheduler.new_box()
+    fresh = scheduler.submit(sum, [2], box_bound=True, callback=results.append)
+    release.set()
+    qtbot.waitUntil(lambda: fresh.done, timeout=1000)
+    assert stale.cancelled
+    assert results == [2]
+    metrics = scheduler.metrics()
+    assert metrics['cancelled'] == 1
+    assert metrics['queue_depth'] == 0
+
+
+def test_cancel_pending_only(qtbot, scheduler: TaskScheduler):
+    results = []
+    release = threading.Event()
+    running = scheduler.submit(release.wait, 5, callback=results.append)
+    pending = scheduler.submit(sum, [1], callback=results.append)
+    assert not scheduler.cancel(running, running=False)
+    assert scheduler.cancel(pending, running=False)
+    release.set()
+    qtbot.waitUntil(lambda: running.done, timeout=1000)
+    assert results == [True]
+
+
+def test_process_pool(qtbot):
+    scheduler = TaskScheduler(max_workers=1, max_processes=1)
+    results = []
+    scheduler.submit(sum, [1, 2], process=True, callback=results.append)
+    qtbot.waitUntil(lambda: len(results) == 1, timeout=30000)
+    assert results == [3]
+    assert scheduler._processes._mp_context.get_start_method() == 'spawn'
+    scheduler.shutdown(wait=True)
+
+
+def test_latency_metrics(qtbot, scheduler: TaskScheduler):
+    tasks = [scheduler.submit(sum, [i], priority=INTERACTIVE) for i in range(10)]
+    qtbot.waitUntil(lambda: all(task.done for task in tasks), timeout=1000)
+    latency = scheduler.metrics()['latency']['interactive']
+    assert latency['count'] == 10
+    assert 0 <= latency['mean'] <= latency['max'] < 1
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from ..spatial_index import ExtentIndex, TracksIndex
+
+
+# 10 x 10 mosaic of unit tiles in the y/x plane
+@pytest.fixture
+def tile_index():
+    yx = np.stack(np.meshgrid(np.arange(10), np.arange(10), indexing='ij'), axis=-1).reshape(-1, 2)
+    mins = np.column_stack([np.zeros(len(yx)), yx])
+    return ExtentIndex(mins, mins + 1)
+
+
+def test_bounds(tile_index: ExtentIndex):
+    lower, upper = tile_index.bounds
+    assert tuple(lower) == (0, 0, 0)
+    assert tuple(upper) == (1, 10, 10)
+    assert len(tile_index) == 100
+
+
+def test_query(tile_index: ExtentIndex):
+    hits = tile_index.query((0, 2.5, 2.5), (1, 3.5, 4.5))
+    expected = [i for i, (y, x) in enumerate(np.ndindex(10, 10)) if 2 <= y <= 3 and 2 <= x <= 4]
+    assert list(hits) == expected
+
+
+def test_outside(tile_index: ExtentIndex):
+    outside = tile_index.outside((0, 0, 0), (1, 0.5, 0.5))
+    assert not outside[0]
+    assert outside[1:].all()
+    assert tile_index.outside((2, 0, 0), (3, 10, 10)).all()
+
+
+def test_query_prunes_mosaic():
+    # 32 x 32 tiles sharing z, a small query only checks the tiles of a few columns
+    yx = np.stack(np.meshgrid(np.arange(32), np.arange(32), indexing='ij'), axis=-1).reshape(-1, 2) * 10.
+    mins = np.column_stack([np.zeros(len(yx)), yx])
+    index = ExtentIndex(mins, mins + (5, 10, 10))
+    lower, upper = np.array([0, 155, 95]), np.array([5, 175, 105])
+    expected = np.flatnonzero(np.all(index.maxs >= lower, axis=1) & np.all(index.mins <= upper, axis=1))
+    np.testing.assert_array_equal(index.query(lower, upper), expected)
+    assert index.last_scanned <= 3 * 32
+
+
+def random_tracks(nvertices, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 1000, size=(nvertices, 3)), rng.integers(0, 100, size=nvertices)
+
+
+def test_tracks_index_query():
+    coords, times = random_tracks(20000)
+    index = TracksIndex(coords, times)
+    lower, upper = np.array([100, 200, 300]), np.array([400, 500, 450])
+    expected = np.flatnonzero(
+        np.all(coords >= lower, axis=1) & np.all(coords <= upper, axis=1) & (times >= 10) & (times <= 20)
+    )
+    np.testing.assert_array_equal(index.query(lower, upper, (10, 20)), expected)
+    # unbounded axes and no time window
+    expected = np.flatnonzero(coords[:, 0] <= 50)
+    np.testing.assert_array_equal(index.query((-np.inf, -np.inf, -np.inf), (50, np.inf, np.inf)), expected)
+    assert not len(index.query((2000, 0, 0), (3000, 10, 10)))
+
+
+def test_tracks_index_sublinear():
+    # a box of fixed size visits a roughly constant number of vertices while the data grows 100 fold
+    lower, upper, t_range = np.array([500, 500, 500]), np.array([520, 520, 520]), (50, 52)
+    scanned = []
+    for nvertices in (10 ** 4, 10 ** 6):
+        index = TracksIndex(*random_tracks(nvertices))
+        index.query(lower, upper, t_range)
+        scanned.append(index.last_scanned)
+    assert scanned[1] < 10 ** 6 / 100
+    assert scanned[1] < 20 * max(scanned[0], 1)
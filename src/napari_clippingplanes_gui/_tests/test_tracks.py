@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from ..utils import CPManager
+from ..widgets import ClippingSliderWidget
+
+
+# two tracks along x, one at y = 10 and one at y = 90
+@pytest.fixture
+def viewer(make_napari_viewer):
+    nv = make_napari_viewer()
+    nv.add_image(np.zeros((10, 100, 100)), name='3D')
+    t = np.arange(10)
+    tracks = np.concatenate([
+        np.column_stack([np.full(10, 1), t, np.full(10, 5), np.full(10, 10), t * 10]),
+        np.column_stack([np.full(10, 2), t, np.full(10, 5), np.full(10, 90), t * 10]),
+    ])
+    nv.add_tracks(tracks, name='tracks')
+    return nv
+
+
+@pytest.fixture
+def cpmanager(viewer):
+    sliders = [ClippingSliderWidget('x'), ClippingSliderWidget('y'), ClippingSliderWidget('z')]
+    return CPManager(viewer, dict(z=(0, 0), y=(2, 1), x=(4, 2)), sliders)
+
+
+def test_tracks_clipping(cpmanager: CPManager):
+    layer = cpmanager.viewer.layers['tracks']
+    assert id(layer) in cpmanager.track_clippers
+    sliders = cpmanager.sliders
+    sliders['y'].set_value((0, 50))
+    assert len(layer.data) == 20
+    sliders['y'].set_state(True)
+    assert set(layer.data[:, 0]) == {1}
+    sliders['x'].set_state(True)
+    sliders['x'].set_value((0, 45))
+    assert len(layer.data) == 5
+    # an empty box hides the layer, disabling all axes restores the full tracks
+    sliders['y'].set_value((40, 50))
+    assert not layer.visible
+    sliders['x'].set_state(False)
+    sliders['y'].set_state(False)
+    assert layer.visible
+    assert len(layer.data) == 20
+
+
+def test_tracks_data_replaced(cpmanager: CPManager):
+    layer = cpmanager.viewer.layers['tracks']
+    clipper = cpmanager.track_clippers[id(layer)]
+    assert len(clipper.index) == 20
+    layer.data = layer.data[:10]
+    assert clipper._index is None
+    assert len(clipper.index) == 10
+
+
+def test_tracks_time_range(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    t = np.arange(50)
+    viewer.add_tracks(
+        np.column_stack([np.full(50, 3), t, np.full(50, 5), np.full(50, 20), np.full(50, 20)]), name='long'
+    )
+    time_range = tuple(viewer.dims.range[0])
+    cpmanager.sliders['y'].set_value((0, 50))
+    cpmanager.sliders['y'].set_state(True)
+    assert len(viewer.layers['long'].data) == 50
+    # clipping keeps all time points browsable
+    assert tuple(viewer.dims.range[0]) == time_range
+    viewer.dims.set_point(0, 49)
+    assert viewer.dims.point[0] == 49
@@ -1,7 +1,11 @@
 import numpy as np
 import pytest
 
-from ..utils import get_spatial_bounds, CPManager
+from napari.layers import Image
+
+from .. import utils
+from ..cache import ArtifactCache
+from ..utils import get_spatial_bounds, data_to_world_batch, CPManager
 from ..widgets import ClippingSliderWidget
 
 # viewer fixture
@@ -102,3 +106,435 @@ def test_layer_inserted(cpmanager: CPManager):
     viewer.add_labels(np.random.randint(0, 10, size=(10, 100, 100)), name='new_labels')
     assert viewer.layers['new_image'].experimental_clipping_planes
     assert not viewer.layers['new_labels'].experimental_clipping_planes
+
+
+def test_data_to_world_batch(viewer):
+    layer = viewer.layers['4D']
+    coords = np.array([[1, 2, 3], [4, 5, 6]])
+    expected = [layer.data_to_world(c)[-3:] for c in coords]
+    np.testing.assert_allclose(data_to_world_batch(layer, coords), expected)
+
+
+def test_layer_inserted_index(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    viewer.layers.insert(0, Image(np.zeros((10, 100, 100)), name='first_image'))
+    assert viewer.layers['first_image'].experimental_clipping_planes
+    assert viewer.layers[-1].name == 'labels'
+
+
+def test_bulk_insert(qtbot, cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    cpmanager.bulk_insert = True
+    for i in range(5):
+        viewer.add_image(np.zeros((10, 20, 20)), name=f'tile_{i}')
+    assert len(cpmanager._pending_layers) == 5
+    assert not viewer.layers['tile_0'].experimental_clipping_planes
+    qtbot.waitUntil(lambda: not cpmanager._pending_layers, timeout=1000)
+    assert all(len(viewer.layers[f'tile_{i}'].experimental_clipping_planes) == 6 for i in range(5))
+
+
+def test_bulk_insert_transforms(qtbot, cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    cpmanager.bulk_insert = True
+    viewer.add_image(np.zeros((10, 20, 30)), name='scaled', scale=(1, 2, 3), translate=(5, 0, -4))
+    viewer.add_image(np.zeros((2, 10, 20, 30)), name='4D tile', scale=(1, 2, 1, 1), translate=(0, 0, 40, 0))
+    qtbot.waitUntil(lambda: not cpmanager._pending_layers, timeout=1000)
+    for name in ('scaled', '4D tile'):
+        layer = viewer.layers[name]
+        local = np.zeros((6, 3))
+        for axis, bounds in enumerate(get_spatial_bounds(layer)):
+            local[2 * axis:2 * axis + 2, axis] = bounds
+        positions = [plane.position for plane in layer.experimental_clipping_planes]
+        np.testing.assert_allclose(positions, data_to_world_batch(layer, local))
+
+
+def test_world_box(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    for i in range(4):
+        viewer.add_image(np.zeros((10, 10, 10)), name=f'tile_{i}', translate=(0, 0, 10 * i))
+    cpmanager.set_world_box(True)
+    # union extent spans all tiles, the same tick is the same world position for every layer
+    assert cpmanager._world_spacing['x'][-1] >= 39
+    sliders = cpmanager.sliders
+    sliders['x'].set_value((0, 10))
+    upper = cpmanager._world_spacing['x'][10]
+    for layer in cpmanager._managed_layers():
+        assert layer.experimental_clipping_planes[5].position[2] == pytest.approx(upper)
+    hidden = {layer.name for layer in cpmanager._hidden_layers}
+    assert {'tile_2', 'tile_3'} <= hidden
+    assert 'tile_0' not in hidden
+    cpmanager.set_world_box(False)
+    assert all(layer.visible for layer in viewer.layers)
+
+
+def test_world_box_reshown_tile(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    for i in range(4):
+        viewer.add_image(np.zeros((10, 10, 10)), name=f'tile_{i}', translate=(0, 0, 10 * i))
+    cpmanager.set_world_box(True)
+    cpmanager.sliders['x'].set_value((0, 10))
+    tile = viewer.layers['tile_3']
+    assert not tile.visible
+    # the user shows the tile again, the next box update hides it without tracking it twice
+    tile.visible = True
+    cpmanager.sliders['x'].set_value((0, 11))
+    assert not tile.visible
+    assert cpmanager._hidden_layers.count(tile) == 1
+    viewer.layers.remove(tile)
+    assert tile not in cpmanager._hidden_layers
+
+
+def test_interactive_lod(cpmanager: CPManager):
+    layer = cpmanager.viewer.layers['3D']
+    data = layer.data
+    cpmanager.set_lod_factor(2)
+    cpmanager.slider_drag_changed('x', True)
+    assert layer.data.shape == (5, 50, 50)
+    assert tuple(layer.scale) == (2, 2, 2)
+    # plane positions keep their world position on the proxy
+    cpmanager.sliders['y'].set_value((10, 20))
+    assert layer.experimental_clipping_planes[3].position[1] == pytest.approx(20)
+    cpmanager.slider_drag_changed('x', False)
+    assert layer.data is data
+    assert tuple(layer.scale) == (1, 1, 1)
+    # proxies are cached and evicted when the cache is full
+    assert id(layer) in cpmanager._lod_proxies
+    cpmanager.memory.set_cache_budget('lod', 0)
+    cpmanager.set_lod_factor(4)
+    cpmanager.slider_drag_changed('x', True)
+    cpmanager.slider_drag_changed('x', False)
+    assert len(cpmanager._lod_proxies) == 1
+
+
+def test_spacing_accounted(cpmanager: CPManager):
+    layer = cpmanager.viewer.layers['3D']
+    tables = [table for each in cpmanager.viewer.layers for table in each.metadata['cp_spacing'].values()]
+    assert cpmanager.memory_usage()['caches']['spacing'] == sum(table.nbytes for table in tables)
+    # the lookup tables are accounted but never evicted
+    cpmanager.set_memory_budget(0)
+    assert 'cp_spacing' in layer.metadata
+    cpmanager.viewer.layers.remove(layer)
+    assert id(layer) not in cpmanager.memory_usage()['layers']
+
+
+def test_presets(qtbot, cpmanager: CPManager):
+    sliders = cpmanager.sliders
+    cpmanager.add_preset('cut', values=dict(z=(2, 4), y=(10, 20), x=(0, 100)), states=dict(z=True, y=True, x=False))
+    full = dict(z=(0, 100), y=(0, 100), x=(0, 100))
+    cpmanager.add_preset('full', values=full, states=dict(z=False, y=False, x=False))
+    # switching must not send any slider signal back into the manager
+    with qtbot.assertNotEmitted(sliders['y'].value_emitter), qtbot.assertNotEmitted(sliders['z'].state_emitter):
+        cpmanager.apply_preset('cut')
+    assert sliders['y'].value == (10, 20)
+    assert sliders['z'].state
+    planes = cpmanager.viewer.layers['3D'].experimental_clipping_planes
+    assert [plane.enabled for plane in planes] == [True, True, True, True, False, False]
+    assert planes[1].position[0] == pytest.approx(0.4)
+    assert planes[3].position[1] == pytest.approx(20)
+    assert 'cut' in cpmanager._preset_planes[id(cpmanager.viewer.layers['3D'])]
+    cpmanager.apply_preset('full')
+    planes = cpmanager.viewer.layers['3D'].experimental_clipping_planes
+    assert not any(plane.enabled for plane in planes)
+    # round trip through the serializable form
+    exported = cpmanager.export_presets()
+    cpmanager.remove_preset('cut')
+    cpmanager.import_presets(exported)
+    assert exported == cpmanager.export_presets()
+
+
+def test_layer_data_changed(cpmanager: CPManager):
+    layer = cpmanager.viewer.layers['3D']
+    sliders = cpmanager.sliders
+    sliders['z'].set_state(True)
+    sliders['z'].set_value((0, 50))
+    spacing_y = layer.metadata['cp_spacing']['y']
+    # relative policy keeps the slider ticks
+    layer.data = np.zeros((20, 100, 100))
+    assert layer.metadata['cp_spacing']['z'][-1] == 20
+    assert layer.metadata['cp_spacing']['y'] is spacing_y
+    assert layer.experimental_clipping_planes[1].position[0] == pytest.approx(10)
+    # absolute policy keeps the plane positions
+    cpmanager.resize_policy = 'absolute'
+    layer.data = np.zeros((40, 100, 100))
+    assert layer.experimental_clipping_planes[1].position[0] == pytest.approx(10)
+    # unchanged spatial shapes are ignored
+    spacing_z = layer.metadata['cp_spacing']['z']
+    layer.data = np.ones((40, 100, 100))
+    assert layer.metadata['cp_spacing']['z'] is spacing_z
+
+
+def test_absolute_resize_keeps_box(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    layer = viewer.layers['3D']
+    cpmanager.resize_policy = 'absolute'
+    cpmanager.sliders['x'].set_value((20, 50))
+    layer.data = np.zeros((10, 100, 200))
+    # the resized layer keeps its planes, the ticks and the other layers stay untouched
+    assert cpmanager.sliders['x'].value == (20, 50)
+    assert layer.experimental_clipping_planes[4].position[2] == pytest.approx(20)
+    assert layer.experimental_clipping_planes[5].position[2] == pytest.approx(50)
+    assert cpmanager.get_clip_slices(layer)[-1] == slice(20, 50)
+    assert viewer.layers['4D'].experimental_clipping_planes[5].position[2] == pytest.approx(50)
+    assert cpmanager.get_clip_slices(viewer.layers['4D'])[-1] == slice(20, 50)
+    # moving the slider maps the ticks onto the grown data again
+    cpmanager.sliders['x'].set_value((20, 60))
+    assert layer.experimental_clipping_planes[5].position[2] == pytest.approx(120)
+    assert cpmanager.get_clip_slices(layer)[-1] == slice(40, 120)
+
+
+def test_absolute_resize_channels(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    channels = [viewer.add_image(np.zeros((10, 100, 100)), name=f'channel_{i}') for i in range(2)]
+    cpmanager.resize_policy = 'absolute'
+    cpmanager.sliders['x'].set_value((20, 50))
+    # the channels grow one after the other, also repeatedly
+    for shape in ((10, 100, 200), (10, 100, 300)):
+        for channel in channels:
+            channel.data = np.zeros(shape)
+            assert cpmanager.sliders['x'].value == (20, 50)
+            for layer in channels:
+                assert layer.experimental_clipping_planes[4].position[2] == pytest.approx(20)
+                assert layer.experimental_clipping_planes[5].position[2] == pytest.approx(50)
+                assert cpmanager.get_clip_slices(layer)[-1] == slice(20, 50)
+
+
+def test_data_changed_while_dragging(cpmanager: CPManager):
+    layer = cpmanager.viewer.layers['3D']
+    cpmanager.set_lod_factor(2)
+    cpmanager.slider_drag_changed('x', True)
+    assert layer.data.shape == (5, 50, 50)
+    # acquisition replaces the data during the drag
+    new_data = np.ones((10, 100, 120))
+    layer.data = new_data
+    assert layer.data.shape == (5, 50, 60)
+    assert layer.metadata['cp_spacing']['x'][-1] == 120
+    cpmanager.slider_drag_changed('x', False)
+    assert layer.data is new_data
+    assert tuple(layer.scale) == (1, 1, 1)
+
+
+def test_close(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    cpmanager.set_lod_factor(2)
+    cpmanager.set_world_box(True)
+    cpmanager.slider_drag_changed('x', True)
+    cpmanager.close()
+    assert viewer.layers['3D'].data.shape == (10, 100, 100)
+    assert all(layer.visible for layer in viewer.layers)
+    layer = viewer.add_image(np.zeros((4, 8, 8)))
+    assert not layer.experimental_clipping_planes
+    # detached layers no longer react to data changes
+    viewer.layers['3D'].data = np.zeros((10, 100, 120))
+    assert viewer.layers['3D'].metadata['cp_spacing']['x'][-1] == 100
+    cpmanager.close()
+
+
+def test_layer_transform_changed(cpmanager: CPManager):
+    layer = cpmanager.viewer.layers['3D']
+    cpmanager.sliders['y'].set_value((10, 20))
+    layer.scale = (1, 2, 1)
+    assert layer.experimental_clipping_planes[3].position[1] == pytest.approx(40)
+
+
+def test_dims_sync(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    viewer.dims.ndisplay = 2
+    full_range = tuple(tuple(r) for r in viewer.dims.range)
+    sliders = cpmanager.sliders
+    sliders['z'].set_state(True)
+    sliders['z'].set_value((20, 50))
+    cpmanager.set_dims_sync(True)
+    z_dim = viewer.dims.ndim - 3
+    start, stop, _ = viewer.dims.range[z_dim]
+    assert start == pytest.approx(2)
+    assert stop == pytest.approx(5)
+    assert 2 <= viewer.dims.point[z_dim] <= 5
+    # 3D display restores the full ranges
+    viewer.dims.ndisplay = 3
+    assert tuple(tuple(r) for r in viewer.dims.range) == full_range
+    viewer.dims.ndisplay = 2
+    assert viewer.dims.range[z_dim][1] == pytest.approx(5)
+    cpmanager.set_dims_sync(False)
+    assert tuple(tuple(r) for r in viewer.dims.range) == full_range
+
+
+def test_dims_sync_growing_data(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    viewer.dims.ndisplay = 2
+    cpmanager.sliders['z'].set_state(True)
+    cpmanager.set_dims_sync(True)
+    z_dim = viewer.dims.ndim - 3
+    # live acquisition adds z slices, the full range is taken from the grown layers
+    viewer.layers['3D'].data = np.zeros((20, 100, 100))
+    assert viewer.dims.range[z_dim][1] == pytest.approx(19)
+    viewer.dims.set_point(z_dim, 15)
+    assert viewer.dims.point[z_dim] == pytest.approx(15)
+    cpmanager.sliders['z'].set_value((0, 90))
+    assert viewer.dims.range[z_dim][1] == pytest.approx(18)
+    cpmanager.set_dims_sync(False)
+    assert viewer.dims.range[z_dim][1] == pytest.approx(19)
+
+
+def test_dims_sync_lod(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    layer = viewer.layers['3D']
+    cpmanager.set_lod_factor(2)
+    cpmanager.sliders['z'].set_state(True)
+    cpmanager.sliders['z'].set_value((20, 50))
+    z_dim = viewer.dims.ndim - 3
+    viewer.dims.ndisplay = 2
+    cpmanager.set_dims_sync(True)
+    viewer.dims.set_point(z_dim, 3)
+    step = viewer.dims.current_step[z_dim]
+    # no proxies in 2D, the limited range and the slice survive a drag
+    cpmanager.slider_drag_changed('z', True)
+    assert layer.data.shape == (10, 100, 100)
+    cpmanager.slider_drag_changed('z', False)
+    assert tuple(viewer.dims.range[z_dim][:2]) == pytest.approx((2, 5))
+    assert viewer.dims.current_step[z_dim] == step
+    # a drag started in 3D and released in 2D syncs the restored layers
+    viewer.dims.ndisplay = 3
+    cpmanager.slider_drag_changed('z', True)
+    assert layer.data.shape == (5, 50, 50)
+    viewer.dims.ndisplay = 2
+    cpmanager.slider_drag_changed('z', False)
+    assert layer.data.shape == (10, 100, 100)
+    assert tuple(viewer.dims.range[z_dim][:2]) == pytest.approx((2, 5))
+
+
+def test_dims_sync_keeps_camera(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    viewer.dims.ndisplay = 2
+    cpmanager.sliders['x'].set_value((20, 50))
+    cpmanager.set_dims_sync(True)
+    fitted_zoom = viewer.camera.zoom
+    # box changes on a displayed axis leave the user's pan and zoom alone
+    viewer.camera.zoom = fitted_zoom * 3
+    viewer.camera.center = (0, 10, 10)
+    cpmanager.sliders['x'].set_value((30, 60))
+    assert viewer.camera.zoom == pytest.approx(fitted_zoom * 3)
+    assert tuple(viewer.camera.center)[-2:] == pytest.approx((10, 10))
+    # switching back to 2D fits the view again
+    viewer.dims.ndisplay = 3
+    viewer.dims.ndisplay = 2
+    assert viewer.camera.zoom != pytest.approx(fitted_zoom * 3)
+
+
+def test_memory_budget(cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    cpmanager.set_lod_factor(2)
+    cpmanager.slider_drag_changed('x', True)
+    cpmanager.slider_drag_changed('x', False)
+    usage = cpmanager.memory_usage()
+    layer = viewer.layers['3D']
+    assert usage['layers'][id(layer)] == cpmanager._lod_proxies[id(layer)][0].nbytes
+    # removing a layer releases all of its cached memory
+    viewer.layers.remove(layer)
+    assert id(layer) not in cpmanager.memory_usage()['layers']
+    assert id(layer) not in cpmanager._lod_proxies
+    # a smaller budget evicts across the caches
+    cpmanager.set_memory_budget(0)
+    assert len(cpmanager._lod_proxies) <= 1
+
+
+def increment(tile: np.ndarray) -> np.ndarray:
+    return tile + 1
+
+
+def test_get_clip_slices(cpmanager: CPManager):
+    cpmanager.sliders['x'].set_value((20, 50))
+    assert cpmanager.get_clip_slices(cpmanager.viewer.layers['3D']) == (slice(0, 10), slice(0, 100), slice(20, 50))
+    index = cpmanager.get_clip_slices(cpmanager.viewer.layers['4D'])
+    assert isinstance(index[0], int) and 0 <= index[0] < 10
+    assert index[1:] == (slice(0, 10), slice(0, 100), slice(20, 50))
+
+
+def test_run_analysis(qtbot, cpmanager: CPManager):
+    viewer = cpmanager.viewer
+    cpmanager.sliders['x'].set_value((20, 50))
+    progress = []
+    jobs = cpmanager.run_analysis(
+        increment, [viewer.layers['3D']], max_tiles=2, tile_bytes=100 * 30 * 8, name='inc',
+        progress=lambda done, total: progress.append((done, total))
+    )
+    assert len(jobs) == 1
+    qtbot.waitUntil(lambda: 'inc 3D' in viewer.layers, timeout=30000)
+    result = viewer.layers['inc 3D']
+    assert result.data.shape == (10, 100, 30)
+    assert np.all(result.data == 1)
+    # the memory-mapped output is the layer data
+    assert isinstance(result.data, np.memmap)
+    np.testing.assert_allclose(result.translate[-3:], (0, 0, 20))
+    assert progress[-1] == (10, 10)
+    assert not cpmanager.analysis_jobs
+
+
+def test_run_registered_analysis(cpmanager: CPManager):
+    layer = cpmanager.viewer.layers['3D']
+    cpmanager.register_analysis('seg', increment, output='labels', tile_bytes=100 * 100 * 8)
+    jobs = cpmanager.run_analysis('seg', [layer])
+    assert jobs[0].output == 'labels'
+    assert len(jobs[0].tiles) == 10
+    # explicit arguments override the registered defaults
+    jobs += cpmanager.run_analysis('seg', [layer], output='points')
+    assert jobs[1].output == 'points'
+    assert len(jobs[1].tiles) == 10
+    cpmanager.cancel_analysis()
+
+
+def test_chunk_snap(cpmanager: CPManager):
+    da = pytest.importorskip('dask.array')
+    viewer = cpmanager.viewer
+    # x chunk boundaries 0, 32, 64, 96, 100
+    layer = viewer.add_image(da.zeros((10, 100, 100), chunks=(5, 32, 32)), name='chunked')
+    cpmanager.sliders['x'].set_value((30, 70))
+    estimate = cpmanager.estimate_io()
+    assert list(estimate['layers']) == [id(layer)]
+    assert cpmanager.get_clip_slices(layer)[-1] == slice(30, 70)
+    assert estimate['chunks'] == 2 * 4 * 3
+    assert estimate['nbytes'] == 10 * 100 * 96 * 8
+    cpmanager.set_chunk_snap('outward')
+    assert cpmanager.get_clip_slices(layer)[-1] == slice(0, 96)
+    assert layer.experimental_clipping_planes[5].position[2] == pytest.approx(96)
+    assert cpmanager.estimate_io()['chunks'] == estimate['chunks']
+    cpmanager.set_chunk_snap('inward')
+    assert cpmanager.get_clip_slices(layer)[-1] == slice(32, 64)
+    assert cpmanager.estimate_io()['chunks'] == 2 * 4 * 1
+    # unchunked layers are not snapped
+    assert cpmanager.get_clip_slices(viewer.layers['3D'])[-1] == slice(30, 70)
+    cpmanager.set_chunk_snap(None)
+    assert cpmanager.get_clip_slices(layer)[-1] == slice(30, 70)
+
+
+def test_layer_artifact_key_memoized(cpmanager: CPManager, tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, 'layer_dataset_key', lambda layer, data=None: calls.append(layer) or 'dataset')
+    cpmanager.artifact_cache = ArtifactCache(str(tmp_path))
+    layer = cpmanager.viewer.layers['3D']
+    for _ in range(2):
+        artifact = cpmanager.get_layer_artifact(layer, 'profile', lambda: np.arange(5))
+    np.testing.assert_array_equal(artifact, np.arange(5))
+    assert len(calls) == 1
+    # new data invalidates the key
+    layer.data = np.ones((10, 100, 100))
+    cpmanager.get_layer_artifact(layer, 'profile', lambda: np.arange(5))
+    assert len(calls) == 2
+
+
+def test_cached_lod_proxy(qtbot, cpmanager: CPManager, tmp_path):
+    da = pytest.importorskip('dask.array')
+    from napari.layers._source import layer_source
+    path = tmp_path / 'volume.npy'
+    np.save(path, np.ones((8, 16, 16), dtype=np.float32))
+    with layer_source(path=str(path)):
+        layer = Image(da.from_array(np.load(path), chunks=(4, 8, 8)), name='lazy')
+    cache = ArtifactCache(str(tmp_path / 'cache'))
+    cpmanager.artifact_cache = cache
+    cpmanager.set_lod_factor(2)
+    cpmanager.viewer.add_layer(layer)
+    qtbot.waitUntil(lambda: id(layer) in cpmanager._lod_proxies, timeout=5000)
+    proxy, nbytes = cpmanager._lod_proxies[id(layer)]
+    assert isinstance(proxy, np.memmap)
+    assert proxy.shape == (4, 8, 8)
+    assert nbytes == 0
+    assert cache.get(cpmanager._dataset_keys[id(layer)], 'lod_2') is not None
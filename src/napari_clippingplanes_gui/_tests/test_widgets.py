@@ -53,3 +53,9 @@ def test_range_change(qtbot: qtbot, clipping_slider: ClippingSliderWidget):
 
     assert clipping_slider.range == (new_range_min, new_range_max)
 
+
+def test_drag_change(qtbot: qtbot, clipping_slider: ClippingSliderWidget):
+    with qtbot.waitSignal(clipping_slider.drag_emitter, timeout=10, check_params_cb=lambda n, d: n == name and d):
+        clipping_slider.rangeslider.sliderPressed.emit()
+    with qtbot.waitSignal(clipping_slider.drag_emitter, timeout=10, check_params_cb=lambda n, d: n == name and not d):
+        clipping_slider.rangeslider.sliderReleased.emit()
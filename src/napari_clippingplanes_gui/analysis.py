@@ -0,0 +1,413 @@
+import os
+import tempfile
+
+import numpy as np
+
+from multiprocessing import shared_memory
+from qtpy.QtCore import QObject, Signal
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .scheduler import NORMAL, TaskScheduler
+
+# analysis outputs, image and labels are arrays of the tile shape, points are (N, 3) coordinates
+OUTPUTS = ('image', 'labels', 'points')
+# default targeted bytes per tile
+TILE_BYTES = 64 * 2 ** 20
+
+
+def _create_buffer(shape: Tuple[int, ...], dtype, memmap_dir: Optional[str]):
+    """Create a buffer that worker processes can attach to without copying.
+    The cleanup function must be called after the last array view of the buffer was dropped.
+
+    :return: buffer spec for _attach_buffer, array view and cleanup function
+    """
+    nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    if memmap_dir is None:
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+        def cleanup():
+            shm.close()
+            shm.unlink()
+        return ('shm', shm.name), array, cleanup
+    fd, path = tempfile.mkstemp(suffix='.dat', dir=memmap_dir)
+    os.close(fd)
+    array = np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+
+    def cleanup():
+        # the mapping is closed with its last array view
+        os.remove(path)
+    return ('file', path), array, cleanup
+
+
+def _attach_buffer(spec: Tuple[str, str], shape: Tuple[int, ...], dtype):
+    """Attach to a buffer created with _create_buffer.
+
+    :return: array view and close function
+    """
+    kind, name = spec
+    if kind == 'shm':
+        shm = shared_memory.SharedMemory(name=name)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf), shm.close
+    array = np.memmap(name, dtype=dtype, mode='r+', shape=shape)
+    return array, array._mmap.close
+
+
+def run_tile(fn: Callable, slot_spec, slot_shape, dtype, out_spec, out_shape, out_dtype, tile: Tuple[slice, ...],
+             output: str):
+    """Apply an analysis function to a tile copied into a slot buffer, runs in a worker process.
+    Array outputs are written into the output buffer at the tile position, labels outputs return the largest label of
+    the tile and point outputs are returned in region coordinates.
+    """
+    slot, close_slot = _attach_buffer(slot_spec, slot_shape, dtype)
+    try:
+        result = fn(slot[:tile[0].stop - tile[0].start])
+        if output == 'points':
+            return np.asarray(result, dtype=float).reshape(-1, len(out_shape)) + [s.start for s in tile]
+        out, close_out = _attach_buffer(out_spec, out_shape, out_dtype)
+        try:
+            out[tile] = result
+            return int(out[tile].max(initial=0)) if output == 'labels' else None
+        finally:
+            out = None
+            close_out()
+    finally:
+        # views of the slot must be gone before it is closed
+        result = slot = None
+        close_slot()
+
+
+def relabel_tile(out_spec, out_shape, out_dtype, tile: Tuple[slice, ...], table: np.ndarray):
+    """Map the labels of one tile of the output buffer through a lookup table, runs in a worker process.
+    """
+    out, close_out = _attach_buffer(out_spec, out_shape, out_dtype)
+    try:
+        out[tile] = table[out[tile]]
+    finally:
+        out = None
+        close_out()
+
+
+def tile_label_tables(out: np.ndarray, tiles: List[Tuple[slice, ...]], max_labels: List[int]) -> List[np.ndarray]:
+    """Compute lookup tables that give the labels of slab tiles, numbered from 1 in every tile, unique IDs.
+    Labels touching across a slab border get the same ID, only the two planes at each border are read.
+
+    :param out: labels output, still numbered per tile
+    :type out: np.ndarray
+    :param tiles: slab tiles along the first axis, see split_tiles
+    :type tiles: List[Tuple[slice, ...]]
+    :param max_labels: largest label per tile
+    :type max_labels: List[int]
+    :return: lookup table per tile, indexed with the labels of the tile, background stays 0
+    :rtype: List[np.ndarray]
+    """
+    offsets = np.concatenate([[0], np.cumsum(max_labels)]).astype(np.int64)
+    parent = np.arange(offsets[-1] + 1)
+
+    def find(label):
+        while parent[label] != label:
+            parent[label] = parent[parent[label]]
+            label = parent[label]
+        return label
+
+    for k in range(1, len(tiles)):
+        border = tiles[k][0].start
+        below = np.asarray(out[border - 1], dtype=np.int64)
+        above = np.asarray(out[border], dtype=np.int64)
+        touching = (below > 0) & (above > 0)
+        if not touching.any():
+            continue
+        pairs = np.unique(np.stack([below[touching] + offsets[k - 1], above[touching] + offsets[k]]), axis=1)
+        for a, b in pairs.T:
+            a, b = find(a), find(b)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+    # every label points to a smaller one, pointer jumping ends at the roots
+    roots = parent
+    while not np.array_equal(roots[roots], roots):
+        roots = roots[roots]
+    _, ids = np.unique(roots, return_inverse=True)
+    tables = []
+    for k, max_label in enumerate(max_labels):
+        table = ids[offsets[k]:offsets[k] + max_label + 1].copy()
+        table[0] = 0
+        tables.append(table)
+    return tables
+
+
+def split_tiles(shape: Tuple[int, ...], itemsize: int, tile_bytes: int) -> List[Tuple[slice, ...]]:
+    """Split a region into slabs along its first axis of at most tile_bytes (at least one plane per slab).
+
+    :param shape: region shape
+    :type shape: Tuple[int, ...]
+    :param itemsize: bytes per element
+    :type itemsize: int
+    :param tile_bytes: targeted bytes per tile
+    :type tile_bytes: int
+    :return: slices per tile
+    :rtype: List[Tuple[slice, ...]]
+    """
+    plane_bytes = max(int(np.prod(shape[1:])) * itemsize, 1)
+    step = max(tile_bytes // plane_bytes, 1)
+    rest = tuple(slice(0, n) for n in shape[1:])
+    return [(slice(start, min(start + step, shape[0])),) + rest for start in range(0, shape[0], step)]
+
+
+def _expand(tile: Tuple[slice, ...], slices: Tuple) -> List:
+    """Map the tile slices of a region onto the region slices, integer indices (dropped axes) get a placeholder.
+    """
+    tile = iter(tile)
+    return [next(tile) if isinstance(s, slice) else None for s in slices]
+
+
+class AnalysisJob(QObject):
+    """Run an analysis function tile by tile on a clipped region with the process pool of a TaskScheduler.
+    The region is split into slabs, which are streamed from the (possibly lazy) layer data into a bounded set of slot
+    buffers in shared memory, or memory-mapped files, on the thread pool of the scheduler. Every tile is handed to a
+    worker process as soon as it is copied, workers attach to the slot, so tiles are never pickled. Array results are
+    written into a memory-mapped output file, which becomes the result without a copy. At most max_tiles tiles are in
+    flight, so the buffers take about max_tiles * tile_bytes besides the output. The job advances in the callbacks of
+    its tasks in the Qt main thread and never blocks a scheduler thread while workers run.
+
+    Labels are numbered from 1 in every tile. With several tiles a second pass per tile relabels them to unique IDs
+    over the region and merges labels touching across slab borders, see tile_label_tables.
+
+    Class attributes:
+        - progress: signal emitter for (finished tiles, total tiles)
+        - finished: signal emitter for the result, an array for image/labels or (N, 3) coordinates for points output
+        - failed: signal emitter for an error message
+    """
+    progress = Signal(int, int)
+    finished = Signal(object)
+    failed = Signal(str)
+
+    def __init__(self, fn: Callable, data, slices: Tuple[slice, ...], output: str = 'image', output_dtype=None,
+                 max_tiles: Optional[int] = None, tile_bytes: int = TILE_BYTES, memmap_dir: Optional[str] = None):
+        """Initialise class instance.
+
+        :param fn: picklable function, receives a tile and returns an array of the tile shape or (N, 3) coordinates
+        :type fn: Callable
+        :param data: layer data
+        :type data: array like
+        :param slices: region of data to analyze, must select a 3D sub-volume
+        :type slices: Tuple[slice, ...]
+        :param output: one of 'image', 'labels' or 'points', default: 'image'
+        :type output: str
+        :param output_dtype: dtype of array outputs, default: None (input dtype, int32 for labels)
+        :type output_dtype: np.dtype
+        :param max_tiles: maximal number of tiles copied or analyzed at once, default: None (the number of worker
+            processes of the scheduler)
+        :type max_tiles: Optional[int]
+        :param tile_bytes: targeted bytes per tile, default: 64 MiB
+        :type tile_bytes: int
+        :param memmap_dir: directory for memory-mapped buffers instead of shared memory and the system temporary
+            directory for the output, default: None
+        :type memmap_dir: Optional[str]
+        """
+        super().__init__()
+        if output not in OUTPUTS:
+            raise ValueError(f'output must be one of {OUTPUTS}, not {output}')
+        self.fn = fn
+        self.data = data
+        self.slices = slices
+        self.output = output
+        self.dtype = np.dtype(data.dtype)
+        self.output_dtype = np.dtype(output_dtype or (np.int32 if output == 'labels' else self.dtype))
+        self.max_tiles = max_tiles
+        self.memmap_dir = memmap_dir
+        self.shape = tuple(s.stop - s.start for s in slices if isinstance(s, slice))
+        self.tiles = split_tiles(self.shape, self.dtype.itemsize, tile_bytes) if all(self.shape) else []
+        self.relabel = output == 'labels' and len(self.tiles) > 1
+        self.total = len(self.tiles) * (2 if self.relabel else 1)
+        self.done_tiles = 0
+        self.scheduler = None
+        self._cancelled = False
+        self._failed = False
+        self._done = False
+        self._released = False
+        # tasks in flight by token, None until the scheduler returned the task handle
+        self._tasks: Dict[object, Optional[object]] = {}
+        self._slots = []
+        self._free_slots = []
+        self._next_tile = 0
+        self._out_spec = None
+        self._out = None
+        self._points = []
+        self._max_labels = [0] * len(self.tiles)
+        self._relabels = 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def stopped(self) -> bool:
+        return self._cancelled or self._failed
+
+    def start(self, scheduler: TaskScheduler):
+        """Start the job and return right away. Progress and the result are reported with signals in the Qt main thread.
+
+        :param scheduler: scheduler copying the tiles on its thread pool and analyzing them on its process pool
+        :type scheduler: TaskScheduler
+        """
+        if self.stopped:
+            return
+        self.scheduler = scheduler
+        if not self.tiles:
+            self._done = True
+            self.finished.emit(
+                np.zeros((0, len(self.shape))) if self.output == 'points' else np.zeros(self.shape, self.output_dtype)
+            )
+            return
+        slot_shape = (self.tiles[0][0].stop - self.tiles[0][0].start,) + self.shape[1:]
+        for _ in range(min(self.max_tiles or scheduler.max_processes or scheduler.max_workers, len(self.tiles))):
+            self._slots.append(_create_buffer(slot_shape, self.dtype, self.memmap_dir))
+        self._free_slots = list(range(len(self._slots)))
+        if self.output != 'points':
+            self._out_spec, self._out, _ = _create_buffer(
+                self.shape, self.output_dtype, self.memmap_dir or tempfile.gettempdir()
+            )
+        self._fill()
+
+    def cancel(self):
+        """Stop the job. Queued tiles are dropped, running tiles finish and the buffers are released afterwards.
+        """
+        if self.stopped or self._done:
+            return
+        self._cancelled = True
+        self._drop_queued()
+        self._release()
+
+    def _fill(self):
+        """Copy the next tiles into the free slots, each tile is analyzed as soon as it is copied.
+        """
+        while self._free_slots and self._next_tile < len(self.tiles) and not self.stopped:
+            slot = self._free_slots.pop()
+            index = self._next_tile
+            self._next_tile += 1
+            self._submit(
+                self._load_tile, slot, index, callback=lambda _, slot=slot, index=index: self._analyze(slot, index)
+            )
+
+    def _load_tile(self, slot: int, index: int):
+        """Copy a tile from the layer data into a slot buffer, runs on the thread pool of the scheduler.
+        """
+        tile = self.tiles[index]
+        source = tuple(
+            slice(s.start + t.start, s.start + t.stop) if isinstance(s, slice) else s
+            for s, t in zip(self.slices, _expand(tile, self.slices))
+        )
+        self._slots[slot][1][:tile[0].stop - tile[0].start] = np.asarray(self.data[source])
+
+    def _analyze(self, slot: int, index: int):
+        """Hand a copied tile to a worker process.
+        """
+        spec, array, _ = self._slots[slot]
+        self._submit(
+            run_tile, self.fn, spec, array.shape, self.dtype, self._out_spec, self.shape, self.output_dtype,
+            self.tiles[index], self.output, process=True,
+            callback=lambda result, slot=slot, index=index: self._analyzed(slot, index, result)
+        )
+
+    def _analyzed(self, slot: int, index: int, result):
+        """Collect the result of a tile, free its slot and copy the next tile.
+        """
+        self._free_slots.append(slot)
+        if self.output == 'points':
+            self._points.append(result)
+        elif self.output == 'labels':
+            self._max_labels[index] = result
+        self._step()
+        if self._next_tile < len(self.tiles):
+            self._fill()
+        elif len(self._free_slots) == len(self._slots):
+            if self.relabel:
+                self._relabel()
+            else:
+                self._finish()
+
+    def _relabel(self):
+        """Give the labels of all tiles unique IDs, one worker task per tile.
+        """
+        tables = tile_label_tables(self._out, self.tiles, self._max_labels)
+        self._relabels = len(self.tiles)
+        for tile, table in zip(self.tiles, tables):
+            self._submit(
+                relabel_tile, self._out_spec, self.shape, self.output_dtype, tile, table.astype(self.output_dtype),
+                process=True, callback=self._relabeled
+            )
+
+    def _relabeled(self, _):
+        self._step()
+        self._relabels -= 1
+        if not self._relabels:
+            self._finish()
+
+    def _step(self):
+        self.done_tiles += 1
+        self.progress.emit(self.done_tiles, self.total)
+
+    def _finish(self):
+        """Emit the result, array outputs are the memory-mapped output buffer itself.
+        """
+        if self.output == 'points':
+            result = np.concatenate(self._points) if self._points else np.zeros((0, len(self.shape)))
+        else:
+            result, self._out = self._out, None
+        self._done = True
+        self.finished.emit(result)
+
+    def _submit(self, fn: Callable, *args, callback: Callable, process: bool = False):
+        """Submit a task of the job to the scheduler and track it until its callback ran.
+        """
+        token = object()
+        self._tasks[token] = None
+
+        def done(result):
+            self._tasks.pop(token, None)
+            if not self.stopped:
+                callback(result)
+            self._release()
+
+        def error(err):
+            self._tasks.pop(token, None)
+            self._fail(err)
+            self._release()
+        task = self.scheduler.submit(fn, *args, priority=NORMAL, callback=done, error_callback=error, process=process)
+        # the callbacks of an instantly finished task may already have run
+        if token in self._tasks:
+            self._tasks[token] = task
+
+    def _fail(self, err: BaseException):
+        if self.stopped:
+            return
+        self._failed = True
+        self._drop_queued()
+        self.failed.emit(str(err))
+
+    def _drop_queued(self):
+        """Cancel the tasks of the job that did not start yet, running tasks are left to finish.
+        """
+        for token, task in list(self._tasks.items()):
+            if task is not None and self.scheduler.cancel(task, running=False):
+                del self._tasks[token]
+
+    def _release(self):
+        """Free the slot buffers and remove the output file once the job is over and none of its tasks is in flight.
+        An output that became the result stays mapped, on POSIX systems the removed file lives on until it is unmapped.
+        """
+        if self._released or self._tasks or not (self._done or self.stopped):
+            return
+        self._released = True
+        cleanups = [cleanup for _, _, cleanup in self._slots]
+        self._slots = []
+        self._free_slots = []
+        for cleanup in cleanups:
+            cleanup()
+        self._out = None
+        if self._out_spec is not None:
+            try:
+                os.remove(self._out_spec[1])
+            except OSError:
+                # still mapped by the result on platforms that can not remove mapped files
+                pass
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from typing import Callable, Dict, Optional, Tuple
+
+# metadata files of zarr (v2 and v3) and n5 directory stores
+METADATA_FILES = ('.zarray', '.zattrs', '.zgroup', '.zmetadata', 'zarr.json', 'attributes.json')
+
+
+def default_cache_dir() -> str:
+    """Return the default directory of the on-disk artifact cache.
+
+    :return: $XDG_CACHE_HOME/napari-clippingplanes-gui, falls back to ~/.cache
+    :rtype: str
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'napari-clippingplanes-gui')
+
+
+def _path_signature(path: str) -> Dict:
+    """Return the identity of a dataset path.
+    Files are identified by size and modification time. Directory stores (e.g. zarr) are identified by the content of
+    their metadata files and the number, total size and latest modification time of all files below them, so rewritten
+    chunks change the signature even if the top-level directory is untouched.
+
+    :param path: existing file or directory
+    :type path: str
+    :return: json serializable signature
+    :rtype: Dict
+    """
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return dict(size=stat.st_size, mtime=stat.st_mtime_ns)
+    metadata = hashlib.blake2b(digest_size=20)
+    count = size = mtime = 0
+    for folder, dirs, files in os.walk(path):
+        dirs.sort()
+        for fname in sorted(files):
+            fpath = os.path.join(folder, fname)
+            stat = os.stat(fpath)
+            count += 1
+            size += stat.st_size
+            mtime = max(mtime, stat.st_mtime_ns)
+            if fname in METADATA_FILES:
+                metadata.update(os.path.relpath(fpath, path).encode())
+                with open(fpath, 'rb') as file:
+                    metadata.update(file.read())
+    return dict(files=count, size=size, mtime=mtime, metadata=metadata.hexdigest())
+
+
+def dataset_key(data, path: Optional[str] = None) -> Optional[str]:
+    """Build the cache key of a dataset.
+    Datasets with a source path are identified by path, shape, dtype and the path signature (see _path_signature).
+    In-memory numpy arrays without a path are identified by shape, dtype and a hash of their content. Other arrays
+    without a path (e.g. lazy arrays) cannot be identified reliably and get no key. Keys are not cheap for large
+    in-memory arrays or directory stores with many chunks, callers should reuse them until the data changes.
+
+    :param data: array like dataset
+    :type data: array like
+    :param path: source path of the dataset, default: None
+    :type path: Optional[str]
+    :return: hex digest or None if the dataset can not be cached
+    :rtype: Optional[str]
+    """
+    ident = dict(shape=list(data.shape), dtype=str(data.dtype))
+    if path is not None and os.path.exists(path):
+        ident.update(path=os.path.abspath(path), **_path_signature(path))
+    elif isinstance(data, np.ndarray):
+        ident.update(content=hashlib.blake2b(np.ascontiguousarray(data).data, digest_size=20).hexdigest())
+    else:
+        return None
+    return hashlib.sha1(json.dumps(ident, sort_keys=True).encode()).hexdigest()
+
+
+def layer_dataset_key(layer, data=None) -> Optional[str]:
+    """Build the cache key of the data of a napari layer, see dataset_key.
+
+    :param layer: napari layer
+    :type layer: napari.layers.Layer
+    :param data: full resolution layer data, default: None (layer.data, its first level for multiscale layers)
+    :type data: array like
+    :return: hex digest or None if the layer data can not be cached
+    :rtype: Optional[str]
+    """
+    source = getattr(layer, 'source', None)
+    path = getattr(source, 'path', None)
+    if data is None:
+        data = layer.data[0] if getattr(layer, 'multiscale', False) else layer.data
+    return dataset_key(data, path)
+
+
+class ArtifactCache:
+    """Persistent on-disk cache of arrays derived from large datasets, e.g. bounds, profiles or occupancy grids.
+    Every artifact is stored as an .npy file in <root>/<dataset key>/<name>.npy and returned memory-mapped. The cache
+    is limited to max_bytes, the least recently used artifacts are evicted first. Files are written to a temporary file
+    and moved into place, so readers never see partial artifacts. Unreadable artifacts are dropped.
+    """
+    def __init__(self, root: Optional[str] = None, max_bytes: int = 10 * 2 ** 30):
+        """Initialise class instance and scan the existing cache directory.
+
+        :param root: cache directory, default: see default_cache_dir
+        :type root: Optional[str]
+        :param max_bytes: size limit of the cache in bytes, default: 10 GiB
+        :type max_bytes: int
+        """
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        os.makedirs(self.root, exist_ok=True)
+        for key in os.listdir(self.root):
+            folder = os.path.join(self.root, key)
+            if not os.path.isdir(folder):
+                continue
+            for fname in os.listdir(folder):
+                if fname.endswith('.npy'):
+                    stat = os.stat(os.path.join(folder, fname))
+                    self._entries[os.path.join(key, fname)] = (stat.st_size, stat.st_atime)
+
+    @property
+    def nbytes(self) -> int:
+        """Return the current size of the cache in bytes.
+
+        :return: size of all cached artifacts
+        :rtype: int
+        """
+        return sum(size for size, _ in self._entries.values())
+
+    def _path(self, key: str, name: str) -> str:
+        return os.path.join(self.root, key, f'{name}.npy')
+
+    def get(self, key: str, name: str) -> Optional[np.ndarray]:
+        """Return a cached artifact.
+
+        :param key: dataset key, see dataset_key
+        :type key: str
+        :param name: artifact name
+        :type name: str
+        :return: read-only memory-mapped artifact or None if it is not cached
+        :rtype: Optional[np.ndarray]
+        """
+        entry = os.path.join(key, f'{name}.npy')
+        with self._lock:
+            if entry not in self._entries:
+                return None
+            path = self._path(key, name)
+            try:
+                artifact = np.load(path, mmap_mode='r', allow_pickle=False)
+            except (OSError, ValueError):
+                self._remove(entry)
+                return None
+            now = time.time()
+            self._entries[entry] = (self._entries[entry][0], now)
+            os.utime(path, (now, os.stat(path).st_mtime))
+        return artifact
+
+    def put(self, key: str, name: str, artifact) -> np.ndarray:
+        """Store an artifact and evict least recently used artifacts if the size limit is exceeded.
+
+        :param key: dataset key, see dataset_key
+        :type key: str
+        :param name: artifact name
+        :type name: str
+        :param artifact: array to store
+        :type artifact: array like
+        :return: read-only memory-mapped stored artifact
+        :rtype: np.ndarray
+        """
+        folder = os.path.join(self.root, key)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.npy', dir=folder)
+        with os.fdopen(fd, 'wb') as file:
+            np.save(file, np.asarray(artifact), allow_pickle=False)
+        path = self._path(key, name)
+        os.replace(tmp, path)
+        with self._lock:
+            self._entries[os.path.join(key, f'{name}.npy')] = (os.path.getsize(path), time.time())
+            self._evict(keep=os.path.join(key, f'{name}.npy'))
+        return np.load(path, mmap_mode='r', allow_pickle=False)
+
+    def get_or_compute(self, key: Optional[str], name: str, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """Return a cached artifact or compute and store it.
+
+        :param key: dataset key, None computes the artifact without caching
+        :type key: Optional[str]
+        :param name: artifact name
+        :type name: str
+        :param compute: function without arguments returning the artifact
+        :type compute: Callable[[], np.ndarray]
+        :return: artifact
+        :rtype: np.ndarray
+        """
+        if key is None:
+            return compute()
+        artifact = self.get(key, name)
+        if artifact is None:
+            artifact = self.put(key, name, compute())
+        return artifact
+
+    def invalidate(self, key: str, name: Optional[str] = None):
+        """Remove one or all artifacts of a dataset.
+
+        :param key: dataset key
+        :type key: str
+        :param name: artifact name, None removes all artifacts of the dataset, default: None
+        :type name: Optional[str]
+        """
+        with self._lock:
+            if name is not None:
+                self._remove(os.path.join(key, f'{name}.npy'))
+                return
+            for entry in [e for e in self._entries if e.startswith(key + os.sep)]:
+                del self._entries[entry]
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+
+    def clear(self):
+        """Remove all artifacts.
+        """
+        for key in {entry.split(os.sep)[0] for entry in list(self._entries)}:
+            self.invalidate(key)
+
+    def _evict(self, keep: Optional[str] = None):
+        total = self.nbytes
+        for entry, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            if entry != keep:
+                self._remove(entry)
+                total -= size
+
+    def _remove(self, entry: str):
+        self._entries.pop(entry, None)
+        try:
+            os.remove(os.path.join(self.root, entry))
+        except OSError:
+            pass
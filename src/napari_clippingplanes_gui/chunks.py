@@ -0,0 +1,81 @@
+import numpy as np
+
+from typing import List, Optional, Tuple
+
+# snap modes of the clip box edges
+SNAP_MODES = (None, 'outward', 'inward')
+
+
+def chunk_boundaries(data) -> Optional[List[np.ndarray]]:
+    """Return the storage chunk grid of chunked array data from its metadata, nothing is read.
+    Dask arrays describe (possibly irregular) chunks per axis, zarr arrays one regular chunk shape.
+
+    :param data: layer data
+    :type data: array like
+    :return: sorted chunk boundaries per axis including 0 and the axis length, None for unchunked data
+    :rtype: Optional[List[np.ndarray]]
+    """
+    chunks = getattr(data, 'chunks', None)
+    if not chunks or len(chunks) != len(data.shape):
+        return None
+    if all(isinstance(c, tuple) for c in chunks):
+        return [np.concatenate([[0], np.cumsum(c)]).astype(np.int64) for c in chunks]
+    return [np.append(np.arange(0, n, max(int(c), 1)), n).astype(np.int64) for c, n in zip(chunks, data.shape)]
+
+
+def snap_range(lower: float, upper: float, boundaries: np.ndarray, mode: str) -> Tuple[float, float]:
+    """Move the edges of an axis range onto chunk boundaries.
+    Inward snapping falls back to outward snapping if no whole chunk lies inside the range.
+
+    :param lower: lower edge
+    :type lower: float
+    :param upper: upper edge
+    :type upper: float
+    :param boundaries: sorted chunk boundaries of the axis
+    :type boundaries: np.ndarray
+    :param mode: 'outward' to grow, 'inward' to shrink the range to the chunk grid
+    :type mode: str
+    :return: snapped lower and upper edge
+    :rtype: Tuple[float, float]
+    """
+    lower, upper = sorted((lower, upper))
+    if mode == 'inward' and _ceil_boundary(boundaries, lower) < _floor_boundary(boundaries, upper):
+        return float(_ceil_boundary(boundaries, lower)), float(_floor_boundary(boundaries, upper))
+    return float(_floor_boundary(boundaries, lower)), float(_ceil_boundary(boundaries, upper))
+
+
+def _floor_boundary(boundaries: np.ndarray, value: float):
+    return boundaries[max(np.searchsorted(boundaries, value, side='right') - 1, 0)]
+
+
+def _ceil_boundary(boundaries: np.ndarray, value: float):
+    return boundaries[min(np.searchsorted(boundaries, value, side='left'), len(boundaries) - 1)]
+
+
+def estimate_io(boundaries: List[np.ndarray], index: Tuple, itemsize: int) -> Tuple[int, int]:
+    """Estimate the chunks and bytes read for an index of chunked data.
+    Chunks are read whole, so the bytes are the uncompressed size of all touched chunks.
+
+    :param boundaries: chunk boundaries per axis, see chunk_boundaries
+    :type boundaries: List[np.ndarray]
+    :param index: one integer or slice (without step) per axis
+    :type index: Tuple
+    :param itemsize: bytes per element
+    :type itemsize: int
+    :return: number of chunks and bytes
+    :rtype: Tuple[int, int]
+    """
+    nchunks = 1
+    nelements = 1
+    for bounds, idx in zip(boundaries, index):
+        if isinstance(idx, slice):
+            start, stop = idx.start, idx.stop
+        else:
+            start, stop = idx, idx + 1
+        if stop <= start:
+            return 0, 0
+        first = np.searchsorted(bounds, start, side='right') - 1
+        last = np.searchsorted(bounds, stop, side='left')
+        nchunks *= int(last - first)
+        nelements *= int(bounds[last] - bounds[first])
+    return nchunks, nelements * itemsize
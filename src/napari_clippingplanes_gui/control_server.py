@@ -0,0 +1,261 @@
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+
+from concurrent.futures import Future
+from qtpy.QtCore import QObject, Signal
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# commands that only depend on their latest occurrence per axis and can be merged
+MERGEABLE_COMMANDS = ('set_box', 'toggle_axis')
+
+
+def merge_commands(commands: List[Dict]) -> List[Dict]:
+    """Merge high rate commands.
+    Of several set_box or toggle_axis commands for the same axis only the latest one is kept. Other commands (e.g.
+    query or apply_preset) act as barriers, commands are never merged across them.
+
+    :param commands: received commands in arrival order
+    :type commands: List[Dict]
+    :return: merged commands in arrival order
+    :rtype: List[Dict]
+    """
+    merged = []
+    latest = {}
+    for command in commands:
+        key = (command.get('cmd'), command.get('axis'))
+        if key[0] in MERGEABLE_COMMANDS:
+            if key in latest:
+                merged[latest[key]] = None
+            latest[key] = len(merged)
+        else:
+            latest = {}
+        merged.append(command)
+    return [command for command in merged if command is not None]
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    """Connection handler, runs in a server thread and never touches Qt objects.
+    Every received line is a JSON command object or a JSON list of command objects. A line containing a query is
+    answered with one JSON line after all its commands have been applied, other lines are not answered.
+    """
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                commands = json.loads(line)
+            except ValueError as err:
+                self._reply(dict(ok=False, error=f'invalid message: {err}'))
+                continue
+            if isinstance(commands, dict):
+                commands = [commands]
+            if not isinstance(commands, list) or not all(isinstance(command, dict) for command in commands):
+                self._reply(dict(ok=False, error='invalid message: expected a command object or a list of them'))
+                continue
+            futures = []
+            for command in commands:
+                if command.get('cmd') == 'query':
+                    command = dict(command, future=Future())
+                    futures.append(command['future'])
+                self.server.control.submit(command)
+            for future in futures:
+                try:
+                    self._reply(future.result(timeout=self.server.control.reply_timeout))
+                except Exception as err:
+                    self._reply(dict(ok=False, error=str(err)))
+
+    def _reply(self, message: Dict):
+        self.wfile.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+        self.wfile.flush()
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _remove_stale_socket(path: str):
+    """Remove a socket file left behind by a crashed server, the socket of a running server is kept.
+
+    :param path: socket path
+    :type path: str
+    """
+    if not os.path.exists(path) or not stat.S_ISSOCK(os.stat(path).st_mode):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.remove(path)
+    finally:
+        probe.close()
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:
+    _UnixServer = None
+
+
+class ControlServer(QObject):
+    """Local control endpoint to drive a CPManager from external processes.
+    Listens on a localhost TCP port or a Unix socket for newline delimited JSON commands. Commands are handed to the Qt
+    main thread through a thread-safe queue, so network traffic can never block the UI.
+
+    Supported commands:
+        - {"cmd": "set_box", "axis": "x", "value": [lower, upper]}: set the slider ticks of an axis
+        - {"cmd": "toggle_axis", "axis": "x", "state": true}: enable/disable the clipping of an axis
+        - {"cmd": "apply_preset", "name": "cut-away"}: switch to a preset of the manager
+        - {"cmd": "query"}: reply with the current state
+
+    Class attributes:
+        - commands_ready: signal emitter, queued to the Qt main thread when new commands arrived
+    """
+    commands_ready = Signal()
+
+    def __init__(self, manager, address: Union[Tuple[str, int], str] = ('127.0.0.1', 0), reply_timeout: float = 5.):
+        """Initialise class instance.
+
+        :param manager: clipping planes manager to control
+        :type manager: napari_clippingplanes_gui.CPManager
+        :param address: (host, port) for TCP or a file path for a Unix socket, default: localhost with a free port
+        :type address: Union[Tuple[str, int], str]
+        :param reply_timeout: maximal time in seconds a query waits for the main thread, default: 5
+        :type reply_timeout: float
+        """
+        super().__init__()
+        self.manager = manager
+        self.reply_timeout = reply_timeout
+        self.handlers = dict(
+            set_box=self._set_box,
+            toggle_axis=self._toggle_axis,
+            apply_preset=self._apply_preset,
+            query=self._query,
+        )
+        self._queue = queue.Queue()
+        self._errors = []
+        if isinstance(address, str):
+            if _UnixServer is None:
+                raise ValueError('Unix sockets are not supported on this platform')
+            _remove_stale_socket(address)
+            self._server = _UnixServer(address, _ControlHandler)
+        else:
+            self._server = _TCPServer(tuple(address), _ControlHandler)
+        self._server.control = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name='ControlServer', daemon=True)
+        self.commands_ready.connect(self.process_commands)
+        self._thread.start()
+
+    @property
+    def address(self) -> Union[Tuple[str, int], str]:
+        """Return the address the server listens on.
+
+        :return: (host, port) for TCP or the socket path
+        :rtype: Union[Tuple[str, int], str]
+        """
+        return self._server.server_address
+
+    def submit(self, command: Dict):
+        """Queue a command for the Qt main thread. Thread-safe.
+
+        :param command: command dictionary
+        :type command: Dict
+        """
+        self._queue.put(command)
+        self.commands_ready.emit()
+
+    def process_commands(self):
+        """Drain the command queue, merge high rate commands and apply them. Runs in the Qt main thread.
+        """
+        commands = []
+        while True:
+            try:
+                commands.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for command in merge_commands(commands):
+            handler = self.handlers.get(command.get('cmd'))
+            try:
+                if handler is None:
+                    raise ValueError(f'unknown command: {command.get("cmd")}')
+                handler(command)
+            except Exception as err:
+                if 'future' in command:
+                    command['future'].set_exception(err)
+                else:
+                    self._errors.append(str(err))
+
+    def _set_box(self, command: Dict):
+        self.manager.sliders[command['axis']].set_value(tuple(command['value']))
+
+    def _toggle_axis(self, command: Dict):
+        self.manager.sliders[command['axis']].set_state(bool(command['state']))
+
+    def _apply_preset(self, command: Dict):
+        self.manager.apply_preset(command['name'])
+
+    def _query(self, command: Dict):
+        errors, self._errors = self._errors, []
+        command['future'].set_result(dict(ok=not errors, errors=errors, state=self.manager.get_state()))
+
+    def close(self):
+        """Stop the server and release the address.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+
+class ControlClient:
+    """Minimal blocking client for a ControlServer, e.g. for acquisition software or tests.
+    """
+    def __init__(self, address: Union[Tuple[str, int], str], timeout: Optional[float] = 5.):
+        """Initialise class instance and connect to the server.
+
+        :param address: (host, port) for TCP or a file path for a Unix socket
+        :type address: Union[Tuple[str, int], str]
+        :param timeout: socket timeout in seconds, default: 5
+        :type timeout: float
+        """
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self._socket = socket.socket(family, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(address)
+        self._file = self._socket.makefile('rb')
+
+    def send(self, commands: Union[Dict, List[Dict]]):
+        """Send one command or a batch of commands without waiting for a reply.
+
+        :param commands: command dictionary or list of command dictionaries
+        :type commands: Union[Dict, List[Dict]]
+        """
+        self._socket.sendall(json.dumps(commands, separators=(',', ':')).encode() + b'\n')
+
+    def query(self, commands: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """Send an optional batch of commands followed by a query and wait for the reply.
+
+        :param commands: commands to apply before the query, default: None
+        :type commands: Optional[List[Dict]]
+        :return: reply of the server
+        :rtype: Dict[str, Any]
+        """
+        self.send(list(commands or []) + [dict(cmd='query')])
+        return json.loads(self._file.readline())
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,5 +1,10 @@
-from qtpy.QtWidgets import QWidget, QVBoxLayout
+from qtpy.QtCore import QTimer
+from qtpy.QtWidgets import (
+    QCheckBox, QComboBox, QHBoxLayout, QLabel, QProgressBar, QPushButton, QWidget, QVBoxLayout
+)
+from typing import Callable
 
+from .chunks import SNAP_MODES
 from .utils import CPManager
 from .widgets import ClippingSliderWidget
 
@@ -22,16 +27,169 @@ class ImgClipperWidget(QWidget):
         self._init_ui()
         self.clipping_plane_manager = CPManager(
             self.viewer, dict(z=(0, 0), y=(2, 1), x=(4, 2)),
-            [self.x_clipping_slider, self.y_clipping_slider, self.z_clipping_slider]
+            [self.x_clipping_slider, self.y_clipping_slider, self.z_clipping_slider], bulk_insert=True
         )
+        # the manager is captured instead of self, which is already being destroyed when the signal is emitted
+        self.destroyed.connect(lambda *_, manager=self.clipping_plane_manager: manager.close())
+        self.world_box_check.stateChanged.connect(
+            lambda: self.clipping_plane_manager.set_world_box(self.world_box_check.isChecked())
+        )
+        self.dims_sync_check.stateChanged.connect(
+            lambda: self.clipping_plane_manager.set_dims_sync(self.dims_sync_check.isChecked())
+        )
+        self.clipping_plane_manager.memory.listeners.append(self.update_memory_label)
+        self.update_memory_label()
+        self.preset_combo.activated.connect(self.preset_selected)
+        self.preset_save_button.clicked.connect(self.save_preset)
+        self.preset_remove_button.clicked.connect(self.remove_preset)
+        self.analysis_run_button.clicked.connect(self.run_analysis)
+        self.analysis_cancel_button.clicked.connect(self.cancel_analysis)
+        self.chunk_snap_combo.currentIndexChanged.connect(
+            lambda index: self.clipping_plane_manager.set_chunk_snap(SNAP_MODES[index])
+        )
+        self._io_update_scheduled = False
+        self.clipping_plane_manager.box_listeners.append(self.schedule_io_label_update)
+        self.update_io_label()
 
     def _init_ui(self):
         self.x_clipping_slider = ClippingSliderWidget(name='x')
         self.y_clipping_slider = ClippingSliderWidget(name='y')
         self.z_clipping_slider = ClippingSliderWidget(name='z')
+        self.world_box_check = QCheckBox('world box')
+        self.world_box_check.setToolTip('Clip all layers with one box over their joint world extent')
+        self.dims_sync_check = QCheckBox('2D box')
+        self.dims_sync_check.setToolTip('Limit the dims sliders and the view to the clip box in 2D display')
+        self.preset_combo = QComboBox()
+        self.preset_combo.setEditable(True)
+        self.preset_combo.setToolTip('Type a name and press save to store the current clip box')
+        self.preset_save_button = QPushButton('save')
+        self.preset_remove_button = QPushButton('remove')
+        self.memory_label = QLabel()
+        self.chunk_snap_combo = QComboBox()
+        self.chunk_snap_combo.addItems(['no chunk snap', 'snap outward', 'snap inward'])
+        self.chunk_snap_combo.setToolTip('Snap the box edges of chunked (zarr, dask) layers to their storage chunks')
+        self.io_label = QLabel()
+        self.analysis_combo = QComboBox()
+        self.analysis_combo.setToolTip('Analysis function, runs on the clipped region of the selected layers')
+        self.analysis_run_button = QPushButton('analyze')
+        self.analysis_cancel_button = QPushButton('cancel')
+        self.analysis_progress = QProgressBar()
+        self.analysis_progress.setValue(0)
 
         layout = QVBoxLayout()
         layout.addWidget(self.x_clipping_slider)
         layout.addWidget(self.y_clipping_slider)
         layout.addWidget(self.z_clipping_slider)
+        mode_layout = QHBoxLayout()
+        mode_layout.addWidget(self.world_box_check)
+        mode_layout.addWidget(self.dims_sync_check)
+        layout.addLayout(mode_layout)
+        chunk_layout = QHBoxLayout()
+        chunk_layout.addWidget(self.chunk_snap_combo)
+        chunk_layout.addWidget(self.io_label)
+        layout.addLayout(chunk_layout)
+        preset_layout = QHBoxLayout()
+        preset_layout.addWidget(self.preset_combo)
+        preset_layout.addWidget(self.preset_save_button)
+        preset_layout.addWidget(self.preset_remove_button)
+        layout.addLayout(preset_layout)
+        analysis_layout = QHBoxLayout()
+        analysis_layout.addWidget(self.analysis_combo)
+        analysis_layout.addWidget(self.analysis_run_button)
+        analysis_layout.addWidget(self.analysis_cancel_button)
+        layout.addLayout(analysis_layout)
+        layout.addWidget(self.analysis_progress)
+        layout.addWidget(self.memory_label)
         self.setLayout(layout)
+
+    def update_memory_label(self):
+        """Show the memory held by the caches of the clipping plane manager.
+        """
+        usage = self.clipping_plane_manager.memory_usage()
+        self.memory_label.setText(
+            f'cache memory: {usage["nbytes"] / 2 ** 20:.1f} / {usage["budget_bytes"] / 2 ** 20:.0f} MiB'
+        )
+
+    def schedule_io_label_update(self):
+        """Update the chunk read estimate once control returns to the event loop, so bursts of box or layer changes
+        (e.g. slider drags, bulk inserts) compute the estimate only once.
+        """
+        if not self._io_update_scheduled:
+            self._io_update_scheduled = True
+            QTimer.singleShot(0, self.update_io_label)
+
+    def update_io_label(self):
+        """Show the storage chunks and bytes the current clip box reads from chunked layers.
+        """
+        self._io_update_scheduled = False
+        estimate = self.clipping_plane_manager.estimate_io()
+        if not estimate['layers']:
+            self.io_label.setText('chunk reads: -')
+            return
+        self.io_label.setText(f'chunk reads: {estimate["chunks"]} ({estimate["nbytes"] / 2 ** 20:.1f} MiB)')
+
+    def preset_selected(self, index: int):
+        """Apply the preset selected in the preset combo box.
+
+        :param index: index of the selected item
+        :type index: int
+        """
+        name = self.preset_combo.itemText(index)
+        if name in self.clipping_plane_manager.presets:
+            self.clipping_plane_manager.apply_preset(name)
+
+    def save_preset(self):
+        """Store the current clip box under the name typed into the preset combo box.
+        """
+        name = self.preset_combo.currentText().strip()
+        if not name:
+            return
+        self.clipping_plane_manager.add_preset(name)
+        if self.preset_combo.findText(name) < 0:
+            self.preset_combo.addItem(name)
+
+    def remove_preset(self):
+        """Remove the preset selected in the preset combo box.
+        """
+        name = self.preset_combo.currentText()
+        if name in self.clipping_plane_manager.presets:
+            self.clipping_plane_manager.remove_preset(name)
+            self.preset_combo.removeItem(self.preset_combo.findText(name))
+
+    def register_analysis(self, name: str, fn: Callable, **kwargs):
+        """Register a named analysis function and offer it in the analysis combo box, see CPManager.register_analysis.
+
+        :param name: function name
+        :type name: str
+        :param fn: picklable function
+        :type fn: Callable
+        """
+        self.clipping_plane_manager.register_analysis(name, fn, **kwargs)
+        if self.analysis_combo.findText(name) < 0:
+            self.analysis_combo.addItem(name)
+
+    def run_analysis(self):
+        """Run the analysis function selected in the analysis combo box on the selected layers.
+        """
+        name = self.analysis_combo.currentText()
+        if name not in self.clipping_plane_manager.analysis_functions:
+            return
+        self.analysis_progress.setValue(0)
+        self.clipping_plane_manager.run_analysis(name, progress=self.update_analysis_progress)
+
+    def update_analysis_progress(self, done: int, total: int):
+        """Show the progress of the running analysis jobs.
+
+        :param done: finished tiles
+        :type done: int
+        :param total: total tiles
+        :type total: int
+        """
+        self.analysis_progress.setMaximum(total)
+        self.analysis_progress.setValue(done)
+
+    def cancel_analysis(self):
+        """Cancel the running analysis jobs.
+        """
+        self.clipping_plane_manager.cancel_analysis()
+        self.analysis_progress.setValue(0)
@@ -0,0 +1,191 @@
+import itertools
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class MemoryBudget:
+    """Memory accounting across the in-memory caches of the plugin.
+    Every cache registers an evict callback and reports the bytes of each item it holds per layer. Once the total
+    exceeds the budget, items are evicted cost-aware (GreedyDual-Size): an item's priority is the current inflation
+    value plus its rebuild cost per byte, the item with the lowest priority is evicted first and its priority becomes
+    the new inflation value. With the default cost (the item size) this is plain least recently used eviction.
+    A cache can have its own cap within the budget, enforced with the same policy among its items. Caches without an
+    evict callback are only accounted, their items count towards the budget but are never evicted.
+    """
+    def __init__(self, budget_bytes: int = 4 * 2 ** 30):
+        """Initialise class instance.
+
+        :param budget_bytes: maximal number of bytes held by all registered caches, default: 4 GiB
+        :type budget_bytes: int
+        """
+        self.budget_bytes = budget_bytes
+        self.listeners: List[Callable[[], None]] = []
+        self._callbacks: Dict[str, Optional[Callable[[Hashable, Hashable], None]]] = {}
+        self._cache_budgets: Dict[str, int] = {}
+        self._entries: Dict[Tuple[str, Hashable, Hashable], List[Any]] = {}
+        self._inflation = 0.
+        self._ticks = itertools.count()
+
+    def register(self, cache: str, evict: Optional[Callable[[Hashable, Hashable], None]],
+                 max_bytes: Optional[int] = None):
+        """Register a cache.
+
+        :param cache: cache name
+        :type cache: str
+        :param evict: called with (layer_key, item_key) to drop an item from the cache, None for a cache that is only
+            accounted
+        :type evict: Optional[Callable[[Hashable, Hashable], None]]
+        :param max_bytes: maximal number of bytes held by this cache, default: None (only the budget applies)
+        :type max_bytes: Optional[int]
+        """
+        self._callbacks[cache] = evict
+        if max_bytes is not None:
+            self._cache_budgets[cache] = max_bytes
+
+    @property
+    def nbytes(self) -> int:
+        """Return the number of bytes held by all registered caches.
+
+        :return: total bytes
+        :rtype: int
+        """
+        return sum(entry[2] for entry in self._entries.values())
+
+    def add(self, cache: str, layer_key: Hashable, item_key: Hashable, nbytes: int, cost: Optional[float] = None):
+        """Account a new cache item and evict other items if the budget is exceeded.
+
+        :param cache: name of a registered cache
+        :type cache: str
+        :param layer_key: key of the layer the item belongs to
+        :type layer_key: Hashable
+        :param item_key: key of the item within the cache and layer
+        :type item_key: Hashable
+        :param nbytes: bytes held by the item
+        :type nbytes: int
+        :param cost: rebuild cost in arbitrary units, default: None (nbytes)
+        :type cost: Optional[float]
+        """
+        cost = nbytes if cost is None else cost
+        key = (cache, layer_key, item_key)
+        self._entries[key] = [self._priority(cost, nbytes), next(self._ticks), nbytes, cost]
+        self._enforce(keep=key)
+        self._notify()
+
+    def touch(self, cache: str, layer_key: Hashable, item_key: Hashable):
+        """Mark a cache item as used.
+
+        :param cache: name of a registered cache
+        :type cache: str
+        :param layer_key: key of the layer the item belongs to
+        :type layer_key: Hashable
+        :param item_key: key of the item within the cache and layer
+        :type item_key: Hashable
+        """
+        entry = self._entries.get((cache, layer_key, item_key))
+        if entry is not None:
+            entry[0] = self._priority(entry[3], entry[2])
+            entry[1] = next(self._ticks)
+
+    def discard(self, cache: str, layer_key: Hashable, item_key: Hashable = None, all_items: bool = False):
+        """Stop accounting cache items the cache dropped by itself.
+
+        :param cache: name of a registered cache
+        :type cache: str
+        :param layer_key: key of the layer the item belongs to, None with all_items for every layer
+        :type layer_key: Hashable
+        :param item_key: key of the item within the cache and layer
+        :type item_key: Hashable
+        :param all_items: discard all items of the layer (or of the cache if layer_key is None), default: False
+        :type all_items: bool
+        """
+        if all_items:
+            keys = [k for k in self._entries if k[0] == cache and (layer_key is None or k[1] == layer_key)]
+        else:
+            keys = [(cache, layer_key, item_key)]
+        for key in keys:
+            self._entries.pop(key, None)
+        self._notify()
+
+    def release_layer(self, layer_key: Hashable):
+        """Evict all cache items of a layer at once, e.g. after the layer was removed.
+
+        :param layer_key: key of the layer
+        :type layer_key: Hashable
+        """
+        for key in [k for k in self._entries if k[1] == layer_key]:
+            self._evict(key)
+        self._notify()
+
+    def set_budget(self, budget_bytes: int):
+        """Change the budget and evict items if it is exceeded.
+
+        :param budget_bytes: maximal number of bytes held by all registered caches
+        :type budget_bytes: int
+        """
+        self.budget_bytes = budget_bytes
+        self._enforce()
+        self._notify()
+
+    def set_cache_budget(self, cache: str, max_bytes: Optional[int]):
+        """Change the cap of a registered cache and evict its items if the cap is exceeded.
+
+        :param cache: name of a registered cache
+        :type cache: str
+        :param max_bytes: maximal number of bytes held by the cache, None to only apply the budget
+        :type max_bytes: Optional[int]
+        """
+        if max_bytes is None:
+            self._cache_budgets.pop(cache, None)
+        else:
+            self._cache_budgets[cache] = max_bytes
+        self._enforce()
+        self._notify()
+
+    def usage(self) -> Dict[str, Any]:
+        """Return the current memory usage.
+
+        :return: total bytes, budget and bytes per cache and per layer
+        :rtype: Dict[str, Any]
+        """
+        per_cache = {cache: 0 for cache in self._callbacks}
+        per_layer = {}
+        for (cache, layer_key, _), entry in self._entries.items():
+            per_cache[cache] = per_cache.get(cache, 0) + entry[2]
+            per_layer[layer_key] = per_layer.get(layer_key, 0) + entry[2]
+        return dict(nbytes=self.nbytes, budget_bytes=self.budget_bytes, caches=per_cache, layers=per_layer)
+
+    def _priority(self, cost: float, nbytes: int) -> float:
+        return self._inflation + cost / max(nbytes, 1)
+
+    def _enforce(self, keep: Optional[Tuple] = None):
+        for cache, max_bytes in self._cache_budgets.items():
+            self._enforce_limit(max_bytes, cache, keep)
+        self._enforce_limit(self.budget_bytes, None, keep)
+
+    def _enforce_limit(self, limit: int, cache: Optional[str], keep: Optional[Tuple]):
+        """Evict the items with the lowest priority until the items of a cache (or of all caches if cache is None) fit
+        into limit.
+        """
+        entries = {key: entry for key, entry in self._entries.items() if cache is None or key[0] == cache}
+        total = sum(entry[2] for entry in entries.values())
+        while total > limit:
+            candidates = [
+                (entry[0], entry[1], key) for key, entry in entries.items()
+                if key != keep and self._callbacks.get(key[0]) is not None
+            ]
+            if not candidates:
+                break
+            priority, _, key = min(candidates)
+            self._inflation = priority
+            total -= entries.pop(key)[2]
+            self._evict(key)
+
+    def _evict(self, key: Tuple):
+        self._entries.pop(key, None)
+        evict = self._callbacks.get(key[0])
+        if evict is not None:
+            evict(key[1], key[2])
+
+    def _notify(self):
+        for listener in self.listeners:
+            listener()
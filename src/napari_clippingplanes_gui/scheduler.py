@@ -0,0 +1,256 @@
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from qtpy.QtCore import QObject, Signal
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# priority classes, lower values run first
+INTERACTIVE = 0
+NORMAL = 1
+SPECULATIVE = 2
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', NORMAL: 'normal', SPECULATIVE: 'speculative'}
+
+
+class Task:
+    """Handle of a scheduled task.
+    The state is one of 'pending', 'running', 'done', 'failed' or 'cancelled'.
+    """
+    def __init__(self, fn: Callable, args: tuple, kwargs: Dict, priority: int, key: Optional[Hashable],
+                 callback: Optional[Callable], error_callback: Optional[Callable], generation: Optional[int],
+                 process: bool):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.key = key
+        self.callback = callback
+        self.error_callback = error_callback
+        self.generation = generation
+        self.process = process
+        self.state = 'pending'
+        self.result = None
+        self.error = None
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.state == 'cancelled'
+
+    @property
+    def done(self) -> bool:
+        return self.state in ('done', 'failed', 'cancelled')
+
+
+class TaskScheduler(QObject):
+    """Shared scheduler for the background work of the plugin.
+    Tasks run on a bounded thread pool or, for picklable functions, on an optional process pool. The process pool is
+    shared by all process tasks of the plugin, so max_processes caps the worker processes globally. Workers are
+    spawned, not forked, so they never inherit the Qt and napari state of the main process. Pending tasks are
+    started by priority class (interactive before normal before speculative), tasks with the same key are only queued
+    once and tasks bound to the clip box are cancelled when the box changes. Results and errors are delivered to the
+    callbacks in the Qt main thread.
+
+    Class attributes:
+        - task_finished: signal emitter for finished tasks, used to hand results over to the Qt main thread
+    """
+    task_finished = Signal(object)
+
+    def __init__(self, max_workers: Optional[int] = None, max_processes: int = 0):
+        """Initialise class instance.
+
+        :param max_workers: size of the thread pool, default: None (number of CPUs, at most 4)
+        :type max_workers: Optional[int]
+        :param max_processes: size of the process pool, 0 runs process tasks on the thread pool, default: 0
+        :type max_processes: int
+        """
+        super().__init__()
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_processes = max_processes
+        self.generation = 0
+        self._threads = ThreadPoolExecutor(self.max_workers, thread_name_prefix='clippingplanes')
+        self._processes = None
+        # reentrant, a future that finishes right away runs its done callback inside _dispatch
+        self._lock = threading.RLock()
+        self._counter = itertools.count()
+        self._queues = {False: [], True: []}
+        self._running = {False: 0, True: 0}
+        self._keys = {}
+        self._completed = 0
+        self._cancelled = 0
+        self._latencies = {priority: deque(maxlen=1000) for priority in PRIORITY_NAMES}
+        self.task_finished.connect(self._deliver)
+
+    def submit(self, fn: Callable, *args, priority: int = NORMAL, key: Optional[Hashable] = None,
+               callback: Optional[Callable[[Any], None]] = None,
+               error_callback: Optional[Callable[[BaseException], None]] = None,
+               box_bound: bool = False, process: bool = False, **kwargs) -> Task:
+        """Schedule a function call.
+
+        :param fn: function to run, must be picklable for process tasks
+        :type fn: Callable
+        :param priority: priority class INTERACTIVE, NORMAL or SPECULATIVE, default: NORMAL
+        :type priority: int
+        :param key: deduplication key, a pending or running task with the same key is returned instead, default: None
+        :type key: Optional[Hashable]
+        :param callback: called with the result in the Qt main thread, default: None
+        :type callback: Optional[Callable[[Any], None]]
+        :param error_callback: called with the exception in the Qt main thread, default: None
+        :type error_callback: Optional[Callable[[BaseException], None]]
+        :param box_bound: cancel the task (or drop its result) when the clip box changes, default: False
+        :type box_bound: bool
+        :param process: run the task on the process pool, default: False
+        :type process: bool
+        :return: task handle
+        :rtype: Task
+        """
+        process = process and self.max_processes > 0
+        with self._lock:
+            if key is not None and key in self._keys:
+                return self._keys[key]
+            task = Task(
+                fn, args, kwargs, priority, key, callback, error_callback, self.generation if box_bound else None,
+                process
+            )
+            if key is not None:
+                self._keys[key] = task
+            heapq.heappush(self._queues[process], (priority, next(self._counter), task))
+        self._dispatch()
+        return task
+
+    def cancel(self, task: Task, running: bool = True) -> bool:
+        """Cancel a task. Pending tasks are never started, the results of running tasks are dropped.
+
+        :param task: task handle
+        :type task: Task
+        :param running: also cancel the task if it is already running, default: True
+        :type running: bool
+        :return: True if the task was cancelled
+        :rtype: bool
+        """
+        with self._lock:
+            if not running and task.state == 'running':
+                return False
+            return self._cancel(task)
+
+    def _cancel(self, task: Task) -> bool:
+        if task.done:
+            return False
+        task.state = 'cancelled'
+        self._cancelled += 1
+        if task.key is not None and self._keys.get(task.key) is task:
+            del self._keys[task.key]
+        return True
+
+    def new_box(self):
+        """Mark all box bound tasks as stale, e.g. after the clip box changed.
+        """
+        with self._lock:
+            self.generation += 1
+            for queue in self._queues.values():
+                for _, _, task in queue:
+                    if task.generation is not None:
+                        self._cancel(task)
+
+    def _stale(self, task: Task) -> bool:
+        return task.generation is not None and task.generation != self.generation
+
+    def _dispatch(self):
+        """Start pending tasks while the pools have free workers.
+        """
+        with self._lock:
+            for process, queue in self._queues.items():
+                limit = self.max_processes if process else self.max_workers
+                while queue and self._running[process] < limit:
+                    _, _, task = heapq.heappop(queue)
+                    if task.cancelled:
+                        continue
+                    task.state = 'running'
+                    task.started = time.perf_counter()
+                    self._running[process] += 1
+                    if process:
+                        if self._processes is None:
+                            self._processes = ProcessPoolExecutor(
+                                self.max_processes, mp_context=multiprocessing.get_context('spawn')
+                            )
+                        future = self._processes.submit(task.fn, *task.args, **task.kwargs)
+                    else:
+                        future = self._threads.submit(task.fn, *task.args, **task.kwargs)
+                    future.add_done_callback(lambda f, t=task: self._finished(t, f))
+
+    def _finished(self, task: Task, future):
+        """Done callback of the pools, runs in a worker thread.
+        """
+        try:
+            task.result = future.result()
+        except BaseException as err:
+            task.error = err
+        task.finished = time.perf_counter()
+        with self._lock:
+            self._running[task.process] -= 1
+            if task.key is not None and self._keys.get(task.key) is task:
+                del self._keys[task.key]
+        self.task_finished.emit(task)
+        self._dispatch()
+
+    def _deliver(self, task: Task):
+        """Hand the result of a finished task to its callbacks, runs in the Qt main thread.
+        """
+        with self._lock:
+            if not task.cancelled and self._stale(task):
+                self._cancel(task)
+            if task.cancelled:
+                return
+            task.state = 'failed' if task.error is not None else 'done'
+            self._completed += 1
+            self._latencies[task.priority].append(task.finished - task.submitted)
+        if task.error is not None:
+            if task.error_callback is not None:
+                task.error_callback(task.error)
+        elif task.callback is not None:
+            task.callback(task.result)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue and latency metrics.
+
+        :return: queue depth, running, completed and cancelled task counts and the mean and maximal latency in
+            seconds (submission to result) of the last 1000 tasks per priority class
+        :rtype: Dict[str, Any]
+        """
+        with self._lock:
+            return dict(
+                queue_depth=sum(not task.cancelled for queue in self._queues.values() for _, _, task in queue),
+                running=sum(self._running.values()),
+                completed=self._completed,
+                cancelled=self._cancelled,
+                latency={
+                    PRIORITY_NAMES[priority]: dict(
+                        count=len(latencies),
+                        mean=sum(latencies) / len(latencies) if latencies else 0.,
+                        max=max(latencies, default=0.),
+                    )
+                    for priority, latencies in self._latencies.items()
+                },
+            )
+
+    def shutdown(self, wait: bool = True):
+        """Cancel all pending tasks and stop the pools.
+
+        :param wait: wait for running tasks, default: True
+        :type wait: bool
+        """
+        with self._lock:
+            for queue in self._queues.values():
+                for _, _, task in queue:
+                    self._cancel(task)
+                queue.clear()
+        self._threads.shutdown(wait=wait)
+        if self._processes is not None:
+            self._processes.shutdown(wait=wait)
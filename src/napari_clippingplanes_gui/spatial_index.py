@@ -0,0 +1,184 @@
+import numpy as np
+
+from typing import Optional, Tuple
+
+
+class ExtentIndex:
+    """Sorted interval index over axis aligned 3D boxes, e.g. the world extents of mosaic tile layers.
+    The boxes are sorted by their lower bound on every axis. A box can only intersect the query box if its lower bound
+    lies between the query lower bound minus the widest box and the query upper bound, which is a contiguous run of
+    each axis order. A query picks the axis with the shortest run, e.g. y or x for tiles sharing z, and checks only
+    those candidates, vectorized over all axes.
+    """
+    def __init__(self, mins, maxs):
+        """Initialise class instance.
+
+        :param mins: lower corners of the boxes, shape (N, 3)
+        :type mins: np.ndarray
+        :param maxs: upper corners of the boxes, shape (N, 3)
+        :type maxs: np.ndarray
+        """
+        self.mins = np.asarray(mins, dtype=float).reshape(-1, 3)
+        self.maxs = np.asarray(maxs, dtype=float).reshape(-1, 3)
+        self.last_scanned = 0
+        self._orders = np.argsort(self.mins, axis=0, kind='stable').T
+        self._sorted_lower = np.take_along_axis(self.mins, self._orders.T, axis=0).T
+        self._max_width = (self.maxs - self.mins).max(axis=0) if len(self.mins) else np.zeros(3)
+
+    def __len__(self) -> int:
+        return len(self.mins)
+
+    @property
+    def bounds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the union extent of all boxes.
+
+        :return: lower and upper corner of the union extent
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        if not len(self):
+            return np.zeros(3), np.zeros(3)
+        return self.mins.min(axis=0), self.maxs.max(axis=0)
+
+    def query(self, lower, upper) -> np.ndarray:
+        """Return the indices of all boxes intersecting the query box (borders included).
+
+        :param lower: lower corner of the query box
+        :type lower: np.ndarray
+        :param upper: upper corner of the query box
+        :type upper: np.ndarray
+        :return: sorted box indices
+        :rtype: np.ndarray
+        """
+        lower = np.asarray(lower, dtype=float)
+        upper = np.asarray(upper, dtype=float)
+        runs = [
+            (np.searchsorted(sorted_lower, lower[axis] - self._max_width[axis], side='left'),
+             np.searchsorted(sorted_lower, upper[axis], side='right'))
+            for axis, sorted_lower in enumerate(self._sorted_lower)
+        ]
+        axis = int(np.argmin([stop - start for start, stop in runs]))
+        candidates = self._orders[axis][slice(*runs[axis])]
+        self.last_scanned = len(candidates)
+        hits = np.all(self.maxs[candidates] >= lower, axis=1) & np.all(self.mins[candidates] <= upper, axis=1)
+        return np.sort(candidates[hits])
+
+    def outside(self, lower, upper) -> np.ndarray:
+        """Return a mask of all boxes that lie completely outside the query box.
+
+        :param lower: lower corner of the query box
+        :type lower: np.ndarray
+        :param upper: upper corner of the query box
+        :type upper: np.ndarray
+        :return: boolean mask, True for boxes without intersection
+        :rtype: np.ndarray
+        """
+        mask = np.ones(len(self), dtype=bool)
+        mask[self.query(lower, upper)] = False
+        return mask
+
+
+class TracksIndex:
+    """Flat bucket index over track vertices, bucketed by time bin and spatial grid cell.
+    The vertices are sorted by bucket key, every bucket is a contiguous run of the vertex order. A query only visits
+    the buckets overlapping the query box and time window, so its cost grows with the number of vertices near the box
+    instead of the total number of vertices.
+    """
+    def __init__(self, coords, times, vertices_per_cell: int = 16, time_bin: float = 1.):
+        """Initialise class instance and build the index.
+
+        :param coords: spatial vertex coordinates (z, y, x), shape (N, 3)
+        :type coords: np.ndarray
+        :param times: vertex time points, shape (N,)
+        :type times: np.ndarray
+        :param vertices_per_cell: targeted mean number of vertices per spatial cell and time bin, default: 16
+        :type vertices_per_cell: int
+        :param time_bin: width of a time bin, default: 1
+        :type time_bin: float
+        """
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        self.times = np.asarray(times, dtype=float).reshape(-1)
+        self.time_bin = time_bin
+        self.last_scanned = 0
+        nvertices = len(self.coords)
+        if nvertices:
+            self.lower = self.coords.min(axis=0)
+            self.upper = self.coords.max(axis=0)
+            self.t_min = self.times.min()
+        else:
+            self.lower = self.upper = np.zeros(3)
+            self.t_min = 0.
+        self.n_time_bins = int((self.times.max() - self.t_min) // time_bin) + 1 if nvertices else 1
+        per_bin = max(nvertices / self.n_time_bins, 1)
+        self.grid = np.full(3, int(np.clip(round((per_bin / vertices_per_cell) ** (1 / 3)), 1, 256)))
+        self.cell_size = np.maximum((self.upper - self.lower) / self.grid, np.finfo(float).eps)
+        keys = self._keys(self._cells(self.coords), self._time_bins(self.times))
+        self.order = np.argsort(keys, kind='stable')
+        self.bucket_keys, starts = np.unique(keys[self.order], return_index=True)
+        self.bucket_starts = np.append(starts, nvertices)
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @property
+    def nbytes(self) -> int:
+        """Return the memory held by the index arrays.
+
+        :return: number of bytes
+        :rtype: int
+        """
+        return sum(a.nbytes for a in (self.coords, self.times, self.order, self.bucket_keys, self.bucket_starts))
+
+    def _cells(self, coords) -> np.ndarray:
+        cells = np.floor((np.asarray(coords, dtype=float) - self.lower) / self.cell_size)
+        return np.clip(cells, 0, self.grid - 1).astype(np.int64)
+
+    def _time_bins(self, times) -> np.ndarray:
+        bins = np.floor((np.asarray(times, dtype=float) - self.t_min) / self.time_bin)
+        return np.clip(bins, 0, self.n_time_bins - 1).astype(np.int64)
+
+    def _keys(self, cells, time_bins) -> np.ndarray:
+        gz, gy, gx = self.grid
+        return ((time_bins * gz + cells[..., 0]) * gy + cells[..., 1]) * gx + cells[..., 2]
+
+    def query(self, lower, upper, t_range: Optional[Tuple[float, float]] = None) -> np.ndarray:
+        """Return the indices of all vertices inside the query box and time window (borders included).
+
+        :param lower: lower corner of the query box, -inf for unbounded axes
+        :type lower: np.ndarray
+        :param upper: upper corner of the query box, inf for unbounded axes
+        :type upper: np.ndarray
+        :param t_range: time window (start, stop), default: None (all time points)
+        :type t_range: Optional[Tuple[float, float]]
+        :return: sorted vertex indices
+        :rtype: np.ndarray
+        """
+        lower = np.asarray(lower, dtype=float)
+        upper = np.asarray(upper, dtype=float)
+        t_start, t_stop = t_range if t_range is not None else (-np.inf, np.inf)
+        self.last_scanned = 0
+        if (
+            not len(self) or np.any(lower > self.upper) or np.any(upper < self.lower)
+            or t_start > self.times.max() or t_stop < self.t_min
+        ):
+            return np.zeros(0, dtype=np.int64)
+        cell_lower, cell_upper = self._cells([np.maximum(lower, self.lower), np.minimum(upper, self.upper)])
+        bin_start, bin_stop = self._time_bins([max(t_start, self.t_min), min(t_stop, self.times.max())])
+        cells = np.stack(np.meshgrid(
+            *[np.arange(lo, hi + 1) for lo, hi in zip(cell_lower, cell_upper)], indexing='ij'
+        ), axis=-1).reshape(-1, 3)
+        time_bins = np.arange(bin_start, bin_stop + 1)
+        keys = self._keys(cells[None, :, :], time_bins[:, None]).ravel()
+        pos = np.searchsorted(self.bucket_keys, keys)
+        found = pos < len(self.bucket_keys)
+        found[found] = self.bucket_keys[pos[found]] == keys[found]
+        pos = pos[found]
+        starts = self.bucket_starts[pos]
+        lengths = self.bucket_starts[pos + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        candidates = self.order[offsets]
+        self.last_scanned = len(candidates)
+        inside = (
+            np.all(self.coords[candidates] >= lower, axis=1) & np.all(self.coords[candidates] <= upper, axis=1)
+            & (self.times[candidates] >= t_start) & (self.times[candidates] <= t_stop)
+        )
+        return np.sort(candidates[inside])
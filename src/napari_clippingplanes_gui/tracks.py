@@ -0,0 +1,133 @@
+import numpy as np
+
+from typing import Optional, Tuple
+
+from .spatial_index import TracksIndex
+
+
+class TracksClipper:
+    """Clip adapter for napari tracks layers.
+    Tracks layers can not be cut with clipping planes, instead the adapter keeps the full track data and shows the
+    subset of vertices inside the clip box and an optional time window. The subset is found with a TracksIndex, which is built on
+    first use and rebuilt lazily after the track data was replaced from outside.
+    """
+    def __init__(self, layer, memory=None):
+        """Initialise class instance.
+
+        :param layer: napari tracks layer, data columns (track_id, t, z, y, x)
+        :type layer: napari.layers.Tracks
+        :param memory: memory accounting for the index, cache name 'tracks_index', default: None
+        :type memory: Optional[napari_clippingplanes_gui.memory.MemoryBudget]
+        """
+        self.layer = layer
+        self.memory = memory
+        self._index = None
+        self._subset = None
+        self._updating = False
+        self._hidden = False
+        self._store_full()
+        self.layer.events.data.connect(self.data_changed)
+
+    def _store_full(self):
+        """Keep the full track data, features and graph of the layer and invalidate the index.
+        """
+        self._data = np.asarray(self.layer.data)
+        self._features = self.layer.features.copy()
+        self._graph = dict(self.layer.graph)
+        self._subset = None
+        self.drop_index()
+
+    @property
+    def index(self) -> TracksIndex:
+        """Return the vertex index of the full track data, build it on first use.
+
+        :return: index over the track vertices
+        :rtype: TracksIndex
+        """
+        if self._index is None:
+            self._index = TracksIndex(self._data[:, -3:], self._data[:, 1])
+            if self.memory is not None:
+                self.memory.add('tracks_index', id(self.layer), None, self._index.nbytes)
+        return self._index
+
+    def drop_index(self):
+        """Drop the vertex index, it is rebuilt on the next query.
+        """
+        if self._index is not None and self.memory is not None:
+            self.memory.discard('tracks_index', id(self.layer), None)
+        self._index = None
+
+    def data_changed(self, event=None):
+        """Callback for layer data events, new track data from outside replaces the stored full data.
+
+        :param event: napari event object, default: None
+        :type event: napari.utils.events.Event
+        """
+        if not self._updating:
+            self._store_full()
+
+    def update(self, lower: Optional[np.ndarray], upper: Optional[np.ndarray],
+               t_range: Optional[Tuple[float, float]] = None):
+        """Show the track vertices inside the clip box and time window.
+        The viewer derives the range of the time axis from the displayed vertices, so a time window narrows the time
+        points that can be browsed.
+
+        :param lower: lower corner of the box in layer data coordinates (z, y, x), None shows all tracks
+        :type lower: Optional[np.ndarray]
+        :param upper: upper corner of the box in layer data coordinates (z, y, x), None shows all tracks
+        :type upper: Optional[np.ndarray]
+        :param t_range: time window (start, stop), default: None (all time points)
+        :type t_range: Optional[Tuple[float, float]]
+        """
+        if lower is None or upper is None:
+            self._show(None)
+            return
+        subset = self.index.query(lower, upper, t_range)
+        self._show(None if len(subset) == len(self._data) else subset)
+
+    def _show(self, subset: Optional[np.ndarray]):
+        """Replace the displayed track data by a subset of the full data.
+
+        :param subset: sorted vertex indices, None for the full data
+        :type subset: Optional[np.ndarray]
+        """
+        if subset is not None and not len(subset):
+            if self.layer.visible:
+                self.layer.visible = False
+                self._hidden = True
+            return
+        if self._hidden:
+            self.layer.visible = True
+            self._hidden = False
+        if (subset is None and self._subset is None) or (
+            subset is not None and self._subset is not None and np.array_equal(subset, self._subset)
+        ):
+            return
+        self._subset = subset
+        color_by = self.layer.color_by
+        self._updating = True
+        try:
+            if subset is None:
+                self.layer.data = self._data
+                self.layer.features = self._features
+                self.layer.graph = self._graph
+            else:
+                data = self._data[subset]
+                track_ids = set(np.unique(data[:, 0]).tolist())
+                self.layer.data = data
+                self.layer.features = self._features.iloc[subset].reset_index(drop=True)
+                graph = {
+                    node: [parent for parent in parents if parent in track_ids]
+                    for node, parents in self._graph.items() if node in track_ids
+                }
+                self.layer.graph = {node: parents for node, parents in graph.items() if parents}
+        finally:
+            self._updating = False
+        if color_by in self.layer.features or color_by == 'track_id':
+            self.layer.color_by = color_by
+
+    def close(self):
+        """Show the full track data again and disconnect from the layer.
+        """
+        self._show(None)
+        self.layer.events.data.disconnect(self.data_changed)
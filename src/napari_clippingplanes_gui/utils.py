@@ -1,9 +1,24 @@
+import os
+
 import numpy as np
 
-from typing import Any, Dict, List, Tuple
+from napari.utils.notifications import show_error
+from qtpy.QtCore import QTimer
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
+from .analysis import TILE_BYTES, AnalysisJob
+from .cache import ArtifactCache, layer_dataset_key
+from .chunks import SNAP_MODES, chunk_boundaries, estimate_io, snap_range
+from .control_server import ControlServer
+from .memory import MemoryBudget
+from .scheduler import SPECULATIVE, TaskScheduler
+from .spatial_index import ExtentIndex
+from .tracks import TracksClipper
 from .widgets import ClippingSliderWidget
 
+# napari layer events that change the data to world transform
+TRANSFORM_EVENTS = ('scale', 'translate', 'rotate', 'shear', 'affine')
+
 
 def get_spatial_bounds(layer) -> List[Tuple[int, Any]]:
     """Extract the border coordinates of an napari layer.
@@ -19,11 +34,90 @@ def get_spatial_bounds(layer) -> List[Tuple[int, Any]]:
     return bounds
 
 
+def data_to_world_batch(layer, coords) -> np.ndarray:
+    """Transform a batch of spatial data coordinates of a napari layer to world coordinates in one pass.
+    Coordinates with less columns than the layer dimensions are padded with leading zeros, like
+    napari.layers.Layer.data_to_world does for a single position. Only the last three (spatial) world coordinates are
+    returned.
+
+    :param layer: napari layer
+    :type layer: napari.layers.Layer
+    :param coords: data coordinates, shape (N, D)
+    :type coords: np.ndarray
+    :return: world coordinates, shape (N, 3)
+    :rtype: np.ndarray
+    """
+    coords = np.atleast_2d(np.asarray(coords, dtype=float))
+    ncols = min(coords.shape[1], layer.ndim)
+    padded = np.zeros((coords.shape[0], layer.ndim))
+    padded[:, -ncols:] = coords[:, -ncols:]
+    world = np.asarray(layer._transforms[1:].simplified(padded))
+    return world[:, -3:]
+
+
+def spatial_affines(layers) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the spatial part of the data to world transforms of several napari layers as stacked arrays.
+    Leading (non-spatial) data coordinates are zero for clipping plane positions, so the last three world coordinates
+    only depend on the last three rows and columns of each affine matrix.
+
+    :param layers: napari layers
+    :type layers: List[napari.layers.Layer]
+    :return: linear parts, shape (L, 3, 3), and translations, shape (L, 3)
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+    matrices = [np.asarray(layer._transforms[1:].simplified.affine_matrix) for layer in layers]
+    linear = np.array([m[-4:-1, -4:-1] for m in matrices]).reshape(-1, 3, 3)
+    translate = np.array([m[-4:-1, -1] for m in matrices]).reshape(-1, 3)
+    return linear, translate
+
+
+def build_lod_proxy(data, factor: int) -> Tuple[Any, int]:
+    """Build a downsampled proxy of volume data by striding its last three (spatial) axes.
+    In-memory data is copied to a contiguous array, lazy arrays (e.g. dask) stay lazy and hold no memory.
+
+    :param data: layer data
+    :type data: array like
+    :param factor: stride along each spatial axis
+    :type factor: int
+    :return: proxy and the number of bytes it holds in memory
+    :rtype: Tuple[Any, int]
+    """
+    proxy = data[(Ellipsis,) + (slice(None, None, factor),) * 3]
+    if isinstance(proxy, np.ndarray):
+        proxy = np.ascontiguousarray(proxy)
+        return proxy, proxy.nbytes
+    return proxy, 0
+
+
+def build_cached_lod_proxy(cache: Optional[ArtifactCache], key: Optional[str], data, factor: int) -> Tuple[Any, int]:
+    """Build the downsampled proxy of volume data through the artifact cache, see build_lod_proxy.
+    The proxy is materialized once and returned memory-mapped from the cache file, so it holds no memory.
+
+    :param cache: artifact cache, None builds the proxy without caching
+    :type cache: Optional[ArtifactCache]
+    :param key: dataset key of the data, None builds the proxy without caching
+    :type key: Optional[str]
+    :param data: layer data
+    :type data: array like
+    :param factor: stride along each spatial axis
+    :type factor: int
+    :return: proxy and the number of bytes it holds in memory
+    :rtype: Tuple[Any, int]
+    """
+    if cache is None or key is None:
+        return build_lod_proxy(data, factor)
+    return cache.get_or_compute(key, f'lod_{factor}', lambda: np.asarray(build_lod_proxy(data, factor)[0])), 0
+
+
 class CPManager:
     """Manager class for napari clipping planes and corresponding slider widgets.
     Manages the construction of clipping planes per image layer and the signal processing.
     """
-    def __init__(self, viewer, ref: Dict, sliders: List[ClippingSliderWidget]):
+    def __init__(self, viewer, ref: Dict, sliders: List[ClippingSliderWidget], bulk_insert: bool = False,
+                 world_box: bool = False, lod_factor: int = 1, lod_cache_bytes: int = 2 ** 30,
+                 artifact_cache: Optional[ArtifactCache] = None, resize_policy: str = 'relative',
+                 dims_sync: bool = False, scheduler: Optional[TaskScheduler] = None,
+                 memory_budget: Optional[MemoryBudget] = None, chunk_snap: Optional[str] = None):
         """Initialise class instance.
 
         :param viewer: napari viewer object to interact with
@@ -32,20 +126,103 @@ class CPManager:
         :type ref: Dict
         :param sliders: list of slider widgets to control the clipping planes
         :type sliders: napari_clippingplanes_gui.ClippingSliderWidget
+        :param bulk_insert: queue inserted layers and spawn their clipping planes after the insertion burst, default:
+            False
+        :type bulk_insert: bool
+        :param world_box: use one world space box over the union extent of all managed layers, default: False
+        :type world_box: bool
+        :param lod_factor: stride of the downsampled proxies shown while a slider is dragged, 1 disables the
+            interactive level of detail, default: 1
+        :type lod_factor: int
+        :param lod_cache_bytes: maximal size of the cached proxies in bytes, a cap of the 'lod' cache within the memory
+            budget, default: 1 GiB
+        :type lod_cache_bytes: int
+        :param artifact_cache: persistent cache for artifacts derived from the layer data, default: None (no caching)
+        :type artifact_cache: Optional[ArtifactCache]
+        :param resize_policy: how clip boxes follow growing layer data, 'relative' keeps the slider ticks, 'absolute'
+            keeps the plane positions of the resized layer except planes at the range ends, default: 'relative'
+        :type resize_policy: str
+        :param dims_sync: limit the dims slider ranges and the view to the clip box in 2D display, default: False
+        :type dims_sync: bool
+        :param scheduler: scheduler for background work, default: None (a new TaskScheduler with one worker process per
+            CPU)
+        :type scheduler: Optional[TaskScheduler]
+        :param memory_budget: memory accounting of all in-memory caches, default: None (a new 4 GiB MemoryBudget)
+        :type memory_budget: Optional[MemoryBudget]
+        :param chunk_snap: snap the box edges of chunked layers to their storage chunk grid, 'outward' or 'inward',
+            default: None (no snapping)
+        :type chunk_snap: Optional[str]
         """
         super().__init__()
         self.viewer = viewer
         self.ref = ref
+        self._closed = False
+        self.bulk_insert = bulk_insert
+        self._pending_layers = []
+        self._flush_scheduled = False
+        self.world_box = False
+        self._world_spacing = {}
+        self._extent_index = None
+        self._index_layers = []
+        self._hidden_layers = []
+        self.control_server = None
+        self.lod_factor = max(1, int(lod_factor))
+        self._lod_proxies = {}
+        self._lod_originals = {}
+        self._lod_swapping = False
+        self.resize_policy = resize_policy
+        # plane positions kept by the 'absolute' resize policy, per layer and axis: (slider ticks, data positions)
+        self._held_ranges = {}
+        self.dims_sync = False
+        self._full_dims_range = None
+        self.track_clippers = {}
+        self.scheduler = scheduler or TaskScheduler(max_processes=os.cpu_count() or 1)
+        self.artifact_cache = artifact_cache
+        self._dataset_keys = {}
+        self.presets = {}
+        self._preset_planes = {}
+        self.memory = memory_budget or MemoryBudget()
+        self.memory.register('lod', lambda layer_key, _: self._lod_proxies.pop(layer_key, None),
+                             max_bytes=lod_cache_bytes)
+        # the plane position lookup tables are needed as long as the layer is managed, they are only accounted
+        self.memory.register('spacing', None)
+        self.memory.register('presets', lambda layer_key, name: self._preset_planes.get(layer_key, {}).pop(name, None))
+        self.memory.register('tracks_index', lambda layer_key, _: self.track_clippers[layer_key].drop_index())
+        self.analysis_functions = {}
+        self.analysis_jobs = []
+        if chunk_snap not in SNAP_MODES:
+            raise ValueError(f'chunk_snap must be one of {SNAP_MODES}, not {chunk_snap}')
+        self.chunk_snap = chunk_snap
+        self.box_listeners: List[Callable[[], None]] = []
         self.sliders = {}
         for slider in sliders:
             self._register_slider(slider)
+        self._spawn_clipping_planes([layer for layer in self.viewer.layers if layer._type_string == 'image'])
         for layer in self.viewer.layers:
-            if layer._type_string == 'image':
-                self._layer_spawn_clipping_planes(layer)
+            if layer._type_string == 'tracks':
+                self._add_tracks_layer(layer)
 
         assert self.sliders.keys() == self.ref.keys()
 
         self.viewer.layers.events.inserted.connect(self.layer_inserted)
+        self.viewer.layers.events.removed.connect(self.layer_removed)
+        self.viewer.dims.events.ndisplay.connect(self.dims_display_changed)
+        self.viewer.dims.events.order.connect(self.dims_display_changed)
+        if world_box:
+            self.set_world_box(True)
+        if dims_sync:
+            self.set_dims_sync(True)
+
+    def _managed_layers(self) -> List:
+        """Return all viewer layers with clipping planes controlled by this instance.
+
+        :return: list of managed napari layers
+        :rtype: List[napari.layers.Layer]
+        """
+        return [
+            layer for layer in self.viewer.layers
+            if layer._type_string == 'image' and layer.experimental_clipping_planes
+        ]
 
     def _register_slider(self, slider: ClippingSliderWidget):
         """Register a slider widget to a CPManager instance.
@@ -58,6 +235,7 @@ class CPManager:
         self.sliders[slider.name] = slider
         slider.state_emitter.connect(self.slider_state_changed)
         slider.value_emitter.connect(self.slider_value_changed)
+        slider.drag_emitter.connect(self.slider_drag_changed)
 
     def _unregister_slider(self, slider_name: str) -> ClippingSliderWidget:
         """Unregister a slider widget from a CPManager instance.
@@ -71,40 +249,55 @@ class CPManager:
         slider = self.sliders.pop(slider_name)
         slider.state_emitter.disconnect(self.slider_state_changed)
         slider.value_emitter.disconnect(self.slider_value_changed)
+        slider.drag_emitter.disconnect(self.slider_drag_changed)
         return slider
 
     def _layer_spawn_clipping_planes(self, layer):
-        """Generate clipping planes for a napari viewer layer.
-        The clipping planes will be first generated in form of dictionaries for each spatial axis (x, y, z) of the layer.
-        The dictionaries are then send to layer.experimental_clipping_planes for object creation.
+        """Generate clipping planes for a napari viewer layer, see _spawn_clipping_planes.
 
         :param layer: napari viewer layer for which clipping planes shall be generated
         :type layer: napari.layers.Layer
         """
-        if not layer.experimental_clipping_planes and layer.ndim > 2:
+        self._spawn_clipping_planes([layer])
+
+    def _spawn_clipping_planes(self, layers: List):
+        """Generate clipping planes for napari viewer layers.
+        The clipping planes will be first generated in form of dictionaries for each spatial axis (x, y, z) of the layer.
+        The plane positions of all layers are transformed to world coordinates in one vectorized pass, the dictionaries
+        are then send to layer.experimental_clipping_planes for object creation.
+
+        :param layers: napari viewer layers for which clipping planes shall be generated
+        :type layers: List[napari.layers.Layer]
+        """
+        layers = [layer for layer in layers if not layer.experimental_clipping_planes and layer.ndim > 2]
+        if not layers:
+            return
+        # one row per plane: lower and upper plane of z, y and x
+        positions = np.zeros((len(layers), 6, 3))
+        normals = np.zeros((6, 3), dtype=int)
+        for axis in range(3):
+            normals[2 * axis:2 * axis + 2, axis] = (1, -1)
+        for i, layer in enumerate(layers):
             axis_bounds = get_spatial_bounds(layer)
             layer.metadata['cp_spacing'] = {
                 key: np.linspace(*bounds, num=101)
                 for key, bounds in zip(['z', 'y', 'x'], axis_bounds)
             }
-            cpl = []
-            for axn, (axis, bounds) in zip(('z', 'y', 'x'), enumerate(axis_bounds)):
-                for ind, direction in enumerate((1, -1)):
-                    position = np.zeros(3, dtype=int)
-                    position[axis] = bounds[ind]
-                    position = layer.data_to_world(position)
-                    if len(position) > 3:
-                        position = position[-3:]
-                    normal = np.zeros(3, dtype=int)
-                    normal[axis] = direction
-                    enabled = self.sliders[axn].state
-                    cp_dict = dict(
-                        position=position,
-                        normal=normal,
-                        enabled=enabled
-                    )
-                    cpl.append(cp_dict)
-            layer.experimental_clipping_planes = cpl
+            self.memory.add('spacing', id(layer), None, sum(t.nbytes for t in layer.metadata['cp_spacing'].values()))
+            for axis, bounds in enumerate(axis_bounds):
+                positions[i, 2 * axis:2 * axis + 2, axis] = bounds
+        linear, translate = spatial_affines(layers)
+        positions = np.einsum('lij,lpj->lpi', linear, positions) + translate[:, None, :]
+        enabled = [self.sliders[axn].state for axn in ('z', 'z', 'y', 'y', 'x', 'x')]
+        for layer, layer_positions in zip(layers, positions):
+            layer.experimental_clipping_planes = [
+                dict(position=position, normal=normal, enabled=state)
+                for position, normal, state in zip(layer_positions, normals, enabled)
+            ]
+            layer.events.data.connect(self.layer_data_changed)
+            for name in TRANSFORM_EVENTS:
+                getattr(layer.events, name).connect(self.layer_transform_changed)
+            self._prefetch_lod_proxy(layer)
 
     def slider_state_changed(self, name: str, state: bool):
         """Callback for slider state_changed signals.
@@ -119,6 +312,7 @@ class CPManager:
             if layer._type_string == 'image' and layer.experimental_clipping_planes:
                 layer.experimental_clipping_planes[self.ref[name][0]].enabled = state
                 layer.experimental_clipping_planes[self.ref[name][0] + 1].enabled = state
+        self._box_changed()
 
     def slider_value_changed(self, name: str, crange: Tuple[int, int]):
         """Callback for slider value_changed signals.
@@ -129,29 +323,1068 @@ class CPManager:
         :param crange: clipping range, the position of the "lower" and "upper" clipping plane
         :type crange: Tuple[int, int]
         """
+        # the ticks are the clip box of all layers again
+        for held in self._held_ranges.values():
+            held.pop(name, None)
+        if self.world_box:
+            self._set_world_box_axis(name, crange)
+            self._box_changed()
+            return
         for layer in self.viewer.layers:
             if layer._type_string == 'image' and layer.experimental_clipping_planes:
-                lower = np.zeros(3)
-                lower[self.ref[name][1]] = layer.metadata['cp_spacing'][name][crange[0]]
-                lower = layer.data_to_world(lower)
-                if len(lower) > 3:
-                    lower = lower[-3:]
-                upper = np.zeros(3)
-                upper[self.ref[name][1]] = layer.metadata['cp_spacing'][name][crange[1]]
-                upper = layer.data_to_world(upper)
-                if len(upper) > 3:
-                    upper = upper[-3:]
+                positions = np.zeros((2, 3))
+                positions[:, self.ref[name][1]] = (
+                    self._layer_axis_range(layer, name, crange) / self._layer_lod_factor(layer)
+                )
+                lower, upper = data_to_world_batch(layer, positions)
                 layer.experimental_clipping_planes[self.ref[name][0]].position = lower
                 layer.experimental_clipping_planes[self.ref[name][0] + 1].position = upper
+        self._box_changed()
+
+    def _box_changed(self):
+        """Propagate a changed clip box to the tile visibility (world box mode), the dims ranges (2D mode), the tracks
+        layers and the box listeners. Background tasks bound to the old box are cancelled.
+        """
+        self.scheduler.new_box()
+        if self.world_box:
+            self._update_tile_visibility()
+        if self.dims_sync:
+            self._sync_dims()
+        self._update_tracks()
+        for listener in self.box_listeners:
+            listener()
 
     def layer_inserted(self, event):
         """Callback for napari.Viewer.layers.events.inserted signals.
         A sent signal will start the _layer_spawn_clipping_planes method for a newly added layer. The new layer is
-        extracted from the event source.
+        extracted from the event source at the inserted index. In bulk insert mode the layer is queued instead and the
+        clipping planes of all queued layers are spawned once the insertion burst has ended.
 
-        :param event: napari event object, containing the event source
+        :param event: napari event object, containing the event source and the insertion index
         :type event: napari.utils.events.Event
         """
-        layer = event.source[-1]
-        if layer._type_string == 'image':
+        layer = event.source[event.index]
+        if layer._type_string == 'tracks':
+            self._add_tracks_layer(layer)
+            self._update_tracks()
+            return
+        if layer._type_string != 'image':
+            return
+        if self.bulk_insert:
+            self._pending_layers.append(layer)
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                QTimer.singleShot(0, self.flush_pending_layers)
+        else:
             self._layer_spawn_clipping_planes(layer)
+            self._layers_changed()
+
+    def layer_removed(self, event):
+        """Callback for napari.Viewer.layers.events.removed signals.
+        Drops the removed layer from the internal bookkeeping.
+
+        :param event: napari event object, containing the removed layer as value
+        :type event: napari.utils.events.Event
+        """
+        layer = event.value
+        if layer in self._pending_layers:
+            self._pending_layers.remove(layer)
+        if layer in self._hidden_layers:
+            self._hidden_layers.remove(layer)
+        self._lod_originals.pop(id(layer), None)
+        self._dataset_keys.pop(id(layer), None)
+        self._held_ranges.pop(id(layer), None)
+        self.memory.release_layer(id(layer))
+        if id(layer) in self.track_clippers:
+            self.track_clippers.pop(id(layer)).close()
+        if layer.experimental_clipping_planes:
+            layer.events.data.disconnect(self.layer_data_changed)
+            for name in TRANSFORM_EVENTS:
+                getattr(layer.events, name).disconnect(self.layer_transform_changed)
+        self._layers_changed()
+
+    def layer_data_changed(self, event):
+        """Callback for napari layer data events, e.g. of volumes growing during live acquisition.
+        Only the lookup tables of spatial axes whose size changed are recomputed, unchanged shapes skip the plane update.
+        The clipping planes are then updated in one batch following resize_policy. The 'absolute' policy holds the plane
+        positions of the resized layer for the current slider ticks, other layers and the ticks are left untouched, see
+        _layer_axis_range. Data replaced while a slider is dragged becomes the new full resolution data, the layer
+        keeps showing its proxy until the drag ends.
+
+        :param event: napari event object, containing the layer as source
+        :type event: napari.utils.events.Event
+        """
+        layer = event.source
+        if self._lod_swapping or not layer.experimental_clipping_planes:
+            return
+        self._dataset_keys.pop(id(layer), None)
+        self._drop_lod_proxies(id(layer))
+        swapped = id(layer) in self._lod_originals
+        if swapped:
+            self._lod_originals[id(layer)] = (layer, layer.data, self._lod_originals[id(layer)][2])
+        spacing = layer.metadata['cp_spacing']
+        old_spacing = dict(spacing)
+        changed = []
+        for key, bounds in zip(('z', 'y', 'x'), get_spatial_bounds(layer)):
+            if spacing[key][-1] != bounds[1]:
+                spacing[key] = np.linspace(*bounds, num=101)
+                changed.append(key)
+        if changed:
+            self._drop_preset_planes(id(layer))
+            if self.world_box:
+                self._layers_changed()
+            else:
+                self._resize_planes(layer, changed, old_spacing)
+        elif self.dims_sync:
+            # napari resets the dims ranges to the layer extents on every data change
+            self._sync_dims()
+        if swapped:
+            self._lod_swapping = True
+            try:
+                layer.data = self._get_lod_proxy(layer)
+            finally:
+                self._lod_swapping = False
+        else:
+            self._prefetch_lod_proxy(layer)
+
+    def _resize_planes(self, layer, changed: List[str], old_spacing: Dict[str, np.ndarray]):
+        """Update the clipping planes after spatial axes of a layer changed their size, see layer_data_changed.
+
+        :param layer: managed napari layer
+        :type layer: napari.layers.Layer
+        :param changed: names of the resized axes
+        :type changed: List[str]
+        :param old_spacing: plane position lookup tables of the layer before the resize
+        :type old_spacing: Dict[str, np.ndarray]
+        """
+        if self.resize_policy == 'absolute':
+            spacing = layer.metadata['cp_spacing']
+            held = self._held_ranges.setdefault(id(layer), {})
+            for key in changed:
+                ticks = tuple(int(tick) for tick in self.sliders[key].value)
+                old = held[key][1] if key in held else old_spacing[key][list(ticks)]
+                last = len(spacing[key]) - 1
+                # planes at the range ends follow the data, the others keep their position
+                held[key] = ticks, np.array([
+                    spacing[key][tick] if tick in (0, last) else position for tick, position in zip(ticks, old)
+                ])
+        self._set_layer_planes(layer, self._layer_plane_positions(layer, self._current_box()))
+        self._box_changed()
+
+    def layer_transform_changed(self, event):
+        """Callback for napari layer transform events (scale, translate, rotate, shear, affine).
+        Recomputes the world positions of all clipping planes of the layer in one batch.
+
+        :param event: napari event object, containing the layer as source
+        :type event: napari.utils.events.Event
+        """
+        layer = event.source
+        if self._lod_swapping or not layer.experimental_clipping_planes:
+            return
+        self._drop_preset_planes(id(layer))
+        if self.world_box:
+            self._layers_changed()
+            return
+        self._set_layer_planes(layer, self._layer_plane_positions(layer, self._current_box()))
+
+    def _current_box(self) -> np.ndarray:
+        """Return the current slider values and states.
+
+        :return: one row (lower, upper, enabled) per axis in the order of self.ref
+        :rtype: np.ndarray
+        """
+        return np.array(
+            [(*self.sliders[key].value, self.sliders[key].state) for key in self.ref], dtype=np.int16
+        )
+
+    def _set_layer_planes(self, layer, positions: np.ndarray, enabled: Optional[np.ndarray] = None):
+        """Replace all clipping planes of a layer in one update, keeping their normals.
+
+        :param layer: managed napari layer
+        :type layer: napari.layers.Layer
+        :param positions: new plane positions, shape (6, 3)
+        :type positions: np.ndarray
+        :param enabled: new enabled flags per plane, default: None (keep the current flags)
+        :type enabled: Optional[np.ndarray]
+        """
+        planes = layer.experimental_clipping_planes
+        if enabled is None:
+            enabled = [plane.enabled for plane in planes]
+        layer.experimental_clipping_planes = [
+            dict(position=position, normal=plane.normal, enabled=bool(state))
+            for position, plane, state in zip(positions, planes, enabled)
+        ]
+
+    def _layers_changed(self):
+        """Invalidate the layer extent index and reapply the world space box if it is active. The box listeners are
+        notified, the set of clipped layers changed.
+        """
+        self._extent_index = None
+        self._drop_preset_planes()
+        if self.world_box:
+            # notifies the box listeners
+            self._apply_world_box()
+        else:
+            for listener in self.box_listeners:
+                listener()
+        if self.dims_sync:
+            self._sync_dims()
+
+    def flush_pending_layers(self):
+        """Spawn the clipping planes of all layers queued in bulk insert mode in one pass.
+        Layers that were removed from the viewer in the meantime are skipped.
+        """
+        pending, self._pending_layers = self._pending_layers, []
+        self._flush_scheduled = False
+        if self._closed:
+            return
+        self._spawn_clipping_planes([layer for layer in pending if layer in self.viewer.layers])
+        self._layers_changed()
+
+    def _get_extent_index(self) -> ExtentIndex:
+        """Return the world extent index of all managed layers, rebuild it if it was invalidated.
+        Rebuilding also updates the world space lookup tables of the slider positions.
+
+        :return: extent index, box i belongs to self._index_layers[i]
+        :rtype: ExtentIndex
+        """
+        if self._extent_index is None:
+            self._index_layers = self._managed_layers()
+            extents = np.array([np.asarray(layer.extent.world)[:, -3:] for layer in self._index_layers])
+            extents = extents.reshape(-1, 2, 3)
+            self._extent_index = ExtentIndex(extents[:, 0], extents[:, 1])
+            self._drop_preset_planes()
+            lower, upper = self._extent_index.bounds
+            self._world_spacing = {
+                name: np.linspace(lower[axis], upper[axis], num=101)
+                for name, (_, axis) in self.ref.items()
+            }
+        return self._extent_index
+
+    def get_world_box(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the current world space clip box.
+        Axes with a disabled slider span the union extent of all managed layers.
+
+        :return: lower and upper corner of the box in world coordinates (z, y, x)
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        lower, upper = (bound.copy() for bound in self._get_extent_index().bounds)
+        for name, slider in self.sliders.items():
+            if slider.state:
+                axis = self.ref[name][1]
+                lower[axis], upper[axis] = self._world_spacing[name][list(slider.value)]
+        return lower, upper
+
+    def set_world_box(self, enabled: bool):
+        """Switch between per layer clipping and one world space box over all managed layers.
+        In world box mode the slider ticks are mapped onto the union extent of all managed layers, so the same tick is
+        the same world position for every layer. Layers completely outside the box are hidden, layers crossing the box
+        border are clipped.
+
+        :param enabled: True to use the world space box, False for per layer clipping
+        :type enabled: bool
+        """
+        self.world_box = enabled
+        self._drop_preset_planes()
+        if enabled:
+            self._extent_index = None
+            self._apply_world_box()
+        else:
+            for layer in self._hidden_layers:
+                layer.visible = True
+            self._hidden_layers = []
+            for name, slider in self.sliders.items():
+                self.slider_value_changed(name, slider.value)
+
+    def _apply_world_box(self):
+        """Position the clipping planes of all axes on all managed layers according to the world space box.
+        """
+        self._get_extent_index()
+        for name, slider in self.sliders.items():
+            self._set_world_box_axis(name, slider.value)
+        self._box_changed()
+
+    def _set_world_box_axis(self, name: str, crange: Tuple[int, int]):
+        """Position the clipping planes of one axis on all managed layers in world space.
+
+        :param name: axis name (x, y, z)
+        :type name: str
+        :param crange: clipping range, the slider ticks of the "lower" and "upper" clipping plane
+        :type crange: Tuple[int, int]
+        """
+        self._get_extent_index()
+        lower = np.zeros(3)
+        upper = np.zeros(3)
+        lower[self.ref[name][1]], upper[self.ref[name][1]] = self._world_spacing[name][list(crange)]
+        for layer in self._index_layers:
+            layer.experimental_clipping_planes[self.ref[name][0]].position = lower
+            layer.experimental_clipping_planes[self.ref[name][0] + 1].position = upper
+
+    def _update_tile_visibility(self):
+        """Hide managed layers that lie completely outside the world space box and show them again once they intersect.
+        Layers hidden by the user are left untouched.
+        """
+        outside = self._get_extent_index().outside(*self.get_world_box())
+        for layer, hide in zip(self._index_layers, outside):
+            if hide and layer.visible:
+                layer.visible = False
+                # a tile re-shown by the user is still tracked
+                if layer not in self._hidden_layers:
+                    self._hidden_layers.append(layer)
+            elif not hide and layer in self._hidden_layers:
+                layer.visible = True
+                self._hidden_layers.remove(layer)
+
+    def get_layer_artifact(self, layer, name: str, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """Return an artifact derived from the data of a layer, reuse it from the artifact cache if possible.
+
+        :param layer: napari layer the artifact is derived from
+        :type layer: napari.layers.Layer
+        :param name: artifact name, unique per kind of artifact
+        :type name: str
+        :param compute: function without arguments computing the artifact
+        :type compute: Callable[[], np.ndarray]
+        :return: artifact, memory-mapped if it is cached
+        :rtype: np.ndarray
+        """
+        if self.artifact_cache is None:
+            return compute()
+        return self.artifact_cache.get_or_compute(self._layer_dataset_key(layer), name, compute)
+
+    def _layer_dataset_key(self, layer) -> Optional[str]:
+        """Return the artifact cache key of the full resolution data of a layer, computed once until the data changes.
+
+        :param layer: napari layer
+        :type layer: napari.layers.Layer
+        :return: dataset key, None if the layer data can not be cached
+        :rtype: Optional[str]
+        """
+        if id(layer) not in self._dataset_keys:
+            self._dataset_keys[id(layer)] = layer_dataset_key(layer, self._layer_full_data(layer))
+        return self._dataset_keys[id(layer)]
+
+    def get_state(self) -> Dict[str, Any]:
+        """Return the current clipping state in a JSON serializable form.
+
+        :return: slider states and values per axis and the world box flag
+        :rtype: Dict[str, Any]
+        """
+        return dict(
+            sliders={
+                name: dict(state=bool(slider.state), value=[int(v) for v in slider.value])
+                for name, slider in self.sliders.items()
+            },
+            world_box=self.world_box,
+            presets=list(self.presets),
+        )
+
+    def start_control_server(self, address: Union[Tuple[str, int], str] = ('127.0.0.1', 0)) -> ControlServer:
+        """Start a local control endpoint to drive this instance from external processes.
+        See napari_clippingplanes_gui.control_server.ControlServer for the message format.
+
+        :param address: (host, port) for TCP or a file path for a Unix socket, default: localhost with a free port
+        :type address: Union[Tuple[str, int], str]
+        :return: the running control server
+        :rtype: ControlServer
+        """
+        self.stop_control_server()
+        self.control_server = ControlServer(self, address)
+        return self.control_server
+
+    def close(self):
+        """Detach this instance from the viewer and its layers, stop the control server, running analysis jobs and the
+        background scheduler. Proxies, hidden layers and limited dims ranges are restored, the clipping planes stay
+        where they are. Calling close again has no effect.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._pending_layers = []
+        self.viewer.layers.events.inserted.disconnect(self.layer_inserted)
+        self.viewer.layers.events.removed.disconnect(self.layer_removed)
+        self.viewer.dims.events.ndisplay.disconnect(self.dims_display_changed)
+        self.viewer.dims.events.order.disconnect(self.dims_display_changed)
+        self._leave_lod()
+        for layer in self._managed_layers():
+            layer.events.data.disconnect(self.layer_data_changed)
+            for name in TRANSFORM_EVENTS:
+                getattr(layer.events, name).disconnect(self.layer_transform_changed)
+        for layer in self._hidden_layers:
+            layer.visible = True
+        self._hidden_layers = []
+        self._restore_dims()
+        for clipper in self.track_clippers.values():
+            clipper.close()
+        self.track_clippers = {}
+        for name in list(self.sliders):
+            try:
+                self._unregister_slider(name)
+            except RuntimeError:
+                # the slider widgets were already destroyed with their dock widget
+                self.sliders.pop(name, None)
+        self.stop_control_server()
+        self.cancel_analysis()
+        self.scheduler.shutdown(wait=False)
+
+    def stop_control_server(self):
+        """Stop the local control endpoint if it is running.
+        """
+        if self.control_server is not None:
+            self.control_server.close()
+            self.control_server = None
+
+    def slider_drag_changed(self, name: str, dragging: bool):
+        """Callback for slider drag_changed signals.
+        While a slider handle is pressed all managed layers show a downsampled proxy of their data, on release the full
+        resolution data is restored.
+
+        :param name: axis name (x, y, z)
+        :type name: str
+        :param dragging: True if the slider handle was pressed, False if it was released
+        :type dragging: bool
+        """
+        if dragging:
+            self._enter_lod()
+        else:
+            self._leave_lod()
+
+    def set_lod_factor(self, factor: int):
+        """Set the stride of the interactive level of detail proxies and drop all cached proxies.
+
+        :param factor: stride along each spatial axis, 1 disables the interactive level of detail
+        :type factor: int
+        """
+        self.lod_factor = max(1, int(factor))
+        self._drop_lod_proxies()
+        for layer in self._managed_layers():
+            self._prefetch_lod_proxy(layer)
+
+    def _prefetch_lod_proxy(self, layer):
+        """Build the proxy of a layer in the background at speculative priority, so the first drag needs no copy.
+        Building the proxy of lazy data (e.g. zarr, dask) reads the whole volume, so it is materialized through the
+        artifact cache if one is set and reopening the dataset reuses the memory-mapped proxy. In-memory data is
+        strided directly, copying it is cheaper than hashing it for a cache key.
+
+        :param layer: napari layer
+        :type layer: napari.layers.Layer
+        """
+        if self.lod_factor <= 1 or layer.multiscale or id(layer) in self._lod_proxies:
+            return
+        factor = self.lod_factor
+        data = layer.data
+        cache = None if isinstance(data, np.ndarray) else self.artifact_cache
+        dataset = self._dataset_keys.get(id(layer))
+
+        def build():
+            # the dataset key of a directory store scans its chunk files, so it is computed in the background too
+            key = layer_dataset_key(layer, data) if cache is not None and dataset is None else dataset
+            return build_cached_lod_proxy(cache, key, data, factor), key
+
+        def store(result):
+            (proxy, nbytes), key = result
+            if key is not None and layer.data is data:
+                self._dataset_keys.setdefault(id(layer), key)
+            if factor == self.lod_factor and id(layer) not in self._lod_proxies and layer in self.viewer.layers:
+                self._store_lod_proxy(id(layer), proxy, nbytes)
+
+        self.scheduler.submit(build, priority=SPECULATIVE, key=('lod', id(layer), factor), callback=store)
+
+    def _layer_lod_factor(self, layer) -> int:
+        """Return the stride of the data currently shown by a layer.
+
+        :param layer: napari layer
+        :type layer: napari.layers.Layer
+        :return: proxy stride, 1 for full resolution data
+        :rtype: int
+        """
+        return self.lod_factor if id(layer) in self._lod_originals else 1
+
+    def _get_lod_proxy(self, layer):
+        """Return the cached downsampled proxy of a layer, build it on first use.
+        In-memory proxies are stored as contiguous copies and evicted by the memory budget, within the 'lod' cache cap.
+        Lazy arrays (e.g. dask) stay lazy and hold no memory.
+
+        :param layer: napari layer
+        :type layer: napari.layers.Layer
+        :return: strided proxy of the layer data
+        :rtype: array like
+        """
+        key = id(layer)
+        if key in self._lod_proxies:
+            self.memory.touch('lod', key, None)
+            return self._lod_proxies[key][0]
+        proxy, nbytes = build_lod_proxy(layer.data, self.lod_factor)
+        self._store_lod_proxy(key, proxy, nbytes)
+        return proxy
+
+    def _store_lod_proxy(self, key: int, proxy, nbytes: int):
+        """Add a proxy to the cache and account it in the memory budget, which evicts other proxies if needed.
+
+        :param key: layer id
+        :type key: int
+        :param proxy: downsampled layer data
+        :type proxy: array like
+        :param nbytes: bytes the proxy holds in memory
+        :type nbytes: int
+        """
+        self._lod_proxies[key] = (proxy, nbytes)
+        self.memory.add('lod', key, None, nbytes)
+
+    def _drop_lod_proxies(self, layer_key: Optional[int] = None):
+        """Drop cached proxies.
+
+        :param layer_key: layer id, default: None (all layers)
+        :type layer_key: Optional[int]
+        """
+        if layer_key is None:
+            self._lod_proxies.clear()
+        else:
+            self._lod_proxies.pop(layer_key, None)
+        self.memory.discard('lod', layer_key, all_items=True)
+
+    def _enter_lod(self):
+        """Swap the data of all visible managed layers to their downsampled proxies.
+        The spatial scale is multiplied by the stride, so the proxies cover the same world extent. Multiscale layers are
+        skipped, napari already renders their coarsest level in 3D. In 2D display only one slice is rendered anyway and
+        the swap would reset the dims ranges, so nothing is swapped.
+        """
+        if self.lod_factor <= 1 or self._lod_originals or self.viewer.dims.ndisplay == 2:
+            return
+        self._lod_swapping = True
+        try:
+            self._swap_to_proxies()
+        finally:
+            self._lod_swapping = False
+
+    def _swap_to_proxies(self):
+        """Swap the data and scale of all visible managed layers, see _enter_lod.
+        """
+        for layer in self._managed_layers():
+            if layer.multiscale or not layer.visible:
+                continue
+            proxy = self._get_lod_proxy(layer)
+            self._lod_originals[id(layer)] = (layer, layer.data, tuple(layer.scale))
+            scale = np.array(layer.scale, dtype=float)
+            scale[-3:] *= self.lod_factor
+            layer.data = proxy
+            layer.scale = scale
+
+    def _leave_lod(self):
+        """Restore the full resolution data and scale of all layers showing a proxy.
+        """
+        originals, self._lod_originals = self._lod_originals, {}
+        self._lod_swapping = True
+        try:
+            for layer, data, scale in originals.values():
+                layer.data = data
+                layer.scale = scale
+        finally:
+            self._lod_swapping = False
+        # napari recomputed the dims ranges from the restored layers
+        if originals and self.dims_sync:
+            self._sync_dims()
+
+    def add_preset(self, name: str, values: Optional[Dict[str, Tuple[int, int]]] = None,
+                   states: Optional[Dict[str, bool]] = None):
+        """Store a named clip box.
+        Presets are stored as one row (lower, upper, enabled) per axis in the order of self.ref.
+
+        :param name: preset name, an existing preset with the same name is replaced
+        :type name: str
+        :param values: slider ticks (lower, upper) per axis, default: None (current slider values)
+        :type values: Optional[Dict[str, Tuple[int, int]]]
+        :param states: enabled flag per axis, default: None (current slider states)
+        :type states: Optional[Dict[str, bool]]
+        """
+        values = values or {key: slider.value for key, slider in self.sliders.items()}
+        states = states or {key: slider.state for key, slider in self.sliders.items()}
+        self.presets[name] = np.array(
+            [(*values[key], states[key]) for key in self.ref], dtype=np.int16
+        )
+        self._drop_preset_planes(name=name)
+
+    def remove_preset(self, name: str):
+        """Remove a named clip box.
+
+        :param name: preset name
+        :type name: str
+        """
+        del self.presets[name]
+        self._drop_preset_planes(name=name)
+
+    def _drop_preset_planes(self, layer_key: Optional[int] = None, name: Optional[str] = None):
+        """Drop cached preset plane positions.
+
+        :param layer_key: layer id, default: None (all layers)
+        :type layer_key: Optional[int]
+        :param name: preset name, default: None (all presets)
+        :type name: Optional[str]
+        """
+        for key in [layer_key] if layer_key is not None else list(self._preset_planes):
+            layer_presets = self._preset_planes.get(key, {})
+            for preset in [name] if name is not None else list(layer_presets):
+                if layer_presets.pop(preset, None) is not None:
+                    self.memory.discard('presets', key, preset)
+
+    def export_presets(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Return all presets in a JSON serializable form, e.g. to store them with a viewer session.
+
+        :return: slider value and state per axis for every preset
+        :rtype: Dict[str, Dict[str, Dict[str, Any]]]
+        """
+        return {
+            name: {
+                key: dict(value=[int(row[0]), int(row[1])], state=bool(row[2]))
+                for key, row in zip(self.ref, preset)
+            }
+            for name, preset in self.presets.items()
+        }
+
+    def import_presets(self, presets: Dict[str, Dict[str, Dict[str, Any]]]):
+        """Add presets exported with export_presets.
+
+        :param presets: slider value and state per axis for every preset
+        :type presets: Dict[str, Dict[str, Dict[str, Any]]]
+        """
+        for name, axes in presets.items():
+            self.add_preset(
+                name,
+                {key: tuple(axis['value']) for key, axis in axes.items()},
+                {key: axis['state'] for key, axis in axes.items()},
+            )
+
+    def _layer_plane_positions(self, layer, preset: np.ndarray) -> np.ndarray:
+        """Compute the clipping plane positions of a layer for a clip box.
+
+        :param layer: managed napari layer
+        :type layer: napari.layers.Layer
+        :param preset: one row (lower, upper, enabled) per axis in the order of self.ref
+        :type preset: np.ndarray
+        :return: positions of all clipping planes of the layer, shape (6, 3)
+        :rtype: np.ndarray
+        """
+        positions = np.zeros((len(layer.experimental_clipping_planes), 3))
+        if self.world_box:
+            self._get_extent_index()
+        for key, row in zip(self.ref, preset):
+            index, axis = self.ref[key]
+            if self.world_box:
+                positions[index:index + 2, axis] = self._world_spacing[key][row[:2]]
+            else:
+                positions[index:index + 2, axis] = self._layer_axis_range(layer, key, row[:2])
+        if not self.world_box:
+            positions /= self._layer_lod_factor(layer)
+            positions = data_to_world_batch(layer, positions)
+        return positions
+
+    def apply_preset(self, name: str):
+        """Switch to a named clip box.
+        The plane positions of every preset are cached per layer, so switching replaces the clipping planes of each
+        managed layer in one batched update. The slider widgets are updated without emitting signals.
+
+        :param name: preset name
+        :type name: str
+        """
+        preset = self.presets[name]
+        states = {key: bool(row[2]) for key, row in zip(self.ref, preset)}
+        enabled = np.zeros(6, dtype=bool)
+        for key, (index, _) in self.ref.items():
+            enabled[index:index + 2] = states[key]
+        for layer in self._managed_layers():
+            layer_presets = self._preset_planes.setdefault(id(layer), {})
+            if id(layer) in self._lod_originals:
+                positions = self._layer_plane_positions(layer, preset)
+            else:
+                if name not in layer_presets:
+                    layer_presets[name] = self._layer_plane_positions(layer, preset)
+                    self.memory.add('presets', id(layer), name, layer_presets[name].nbytes)
+                else:
+                    self.memory.touch('presets', id(layer), name)
+                positions = layer_presets[name]
+            self._set_layer_planes(layer, positions, enabled)
+        for key, row in zip(self.ref, preset):
+            self.sliders[key].set_silent(states[key], (int(row[0]), int(row[1])))
+        self._box_changed()
+
+    def get_box_world_extent(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the world extent of the clip box over all managed layers.
+        Axes with a disabled slider span the full extent of the managed layers.
+
+        :return: lower and upper corner of the box in world coordinates (z, y, x)
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        if self.world_box:
+            return self.get_world_box()
+        box = self._current_box()
+        for key, row in zip(self.ref, box):
+            if not row[2]:
+                row[:2] = 0, 100
+        lower = np.full(3, np.inf)
+        upper = np.full(3, -np.inf)
+        for layer in self._managed_layers():
+            positions = self._layer_plane_positions(layer, box)
+            for index, axis in self.ref.values():
+                bounds = positions[index:index + 2, axis]
+                lower[axis] = min(lower[axis], bounds.min())
+                upper[axis] = max(upper[axis], bounds.max())
+        return lower, upper
+
+    def set_dims_sync(self, enabled: bool):
+        """Switch the 2D mode on or off.
+        In 2D display clipping planes have no effect, instead the dims slider ranges of clipped, not displayed axes are
+        limited to the clip box. Slices outside the box are therefore never requested from (lazy) layer data. The view
+        is fitted to the box extent of the displayed axes when the mode is switched on or the display changes to 2D,
+        later box changes leave the camera to the user. In 3D display the full ranges are restored.
+
+        :param enabled: True to sync the clip box with viewer.dims
+        :type enabled: bool
+        """
+        self.dims_sync = enabled
+        if enabled:
+            self._sync_dims(fit_view=True)
+        else:
+            self._restore_dims()
+
+    def dims_display_changed(self, event=None):
+        """Callback for viewer.dims ndisplay and order events.
+
+        :param event: napari event object, default: None
+        :type event: napari.utils.events.Event
+        """
+        if not self.dims_sync:
+            return
+        if self.viewer.dims.ndisplay == 2:
+            self._restore_dims()
+            self._sync_dims(fit_view=True)
+        else:
+            self._restore_dims()
+
+    def _sync_dims(self, fit_view: bool = False):
+        """Limit the dims ranges of clipped, not displayed axes to the clip box.
+
+        :param fit_view: also fit the 2D view to the box extent of the displayed axes, default: False
+        :type fit_view: bool
+        """
+        dims = self.viewer.dims
+        if dims.ndisplay != 2 or not self._managed_layers():
+            return
+        # recomputed on every sync, layer data and extents may have changed since the last one
+        full = self._full_dims_range = self._layer_dims_range()
+        lower, upper = self.get_box_world_extent()
+        offset = dims.ndim - 3
+        fit = []
+        for key, (_, axis) in self.ref.items():
+            dim = offset + axis
+            if dim < 0 or dim >= len(full):
+                continue
+            start, stop, step = full[dim]
+            if not self.sliders[key].state:
+                dims.set_range(dim, full[dim])
+            elif dim in dims.displayed:
+                fit.append((dim, axis))
+            else:
+                dims.set_range(dim, (max(start, lower[axis]), max(min(stop, upper[axis]), start), step))
+        if fit and fit_view:
+            self.viewer.reset_view()
+            self.viewer.camera.zoom *= min(
+                (full[dim][1] - full[dim][0]) / max(upper[axis] - lower[axis], full[dim][2]) for dim, axis in fit
+            )
+            # the last two camera center coordinates belong to the displayed dims
+            center = list(self.viewer.camera.center)
+            for i, dim in enumerate(dims.order[-2:]):
+                if (dim, dim - offset) in fit:
+                    center[len(center) - 2 + i] = (lower[dim - offset] + upper[dim - offset]) / 2
+            self.viewer.camera.center = center
+
+    def _restore_dims(self):
+        """Restore the full dims ranges of the current layers after _sync_dims limited them.
+        """
+        if self._full_dims_range is None:
+            return
+        self._full_dims_range = None
+        for dim, _range in enumerate(self._layer_dims_range()[:self.viewer.dims.ndim]):
+            self.viewer.dims.set_range(dim, _range)
+
+    def _layer_dims_range(self) -> Tuple[Tuple[float, float, float], ...]:
+        """Return the dims ranges spanned by all layers, as napari derives them from the layer extents.
+
+        :return: (start, stop, step) per dim
+        :rtype: Tuple[Tuple[float, float, float], ...]
+        """
+        return tuple(tuple(_range) for _range in self.viewer.layers._ranges)
+
+    def _add_tracks_layer(self, layer):
+        """Attach a TracksClipper to a 3D tracks layer (data columns track_id, t, z, y, x).
+
+        :param layer: napari tracks layer
+        :type layer: napari.layers.Tracks
+        """
+        if layer.data.shape[1] == 5 and id(layer) not in self.track_clippers:
+            self.track_clippers[id(layer)] = TracksClipper(layer, self.memory)
+
+    def _update_tracks(self):
+        """Show the track vertices inside the clip box on all tracks layers.
+        Axes with a disabled slider are unbounded, without any enabled slider the full tracks are shown. The vertices of
+        all time points are kept, the layer itself only draws its tail and head around the current time point. The time
+        range of the viewer dims is derived from the displayed data, a time window would make it collapse.
+        """
+        if not self.track_clippers:
+            return
+        enabled = np.zeros(3, dtype=bool)
+        for key, (_, axis) in self.ref.items():
+            enabled[axis] = self.sliders[key].state
+        if enabled.any():
+            lower, upper = self.get_box_world_extent()
+            lower = np.where(enabled & np.isfinite(lower), lower, -np.inf)
+            upper = np.where(enabled & np.isfinite(upper), upper, np.inf)
+        for clipper in self.track_clippers.values():
+            layer = clipper.layer
+            if not enabled.any():
+                clipper.update(None, None)
+                continue
+            # tracks are assumed to be axis aligned, so scale and translate map the box to data coordinates
+            scale = np.asarray(layer.scale, dtype=float)
+            translate = np.asarray(layer.translate, dtype=float)
+            corners = np.sort((np.stack([lower, upper]) - translate[-3:]) / scale[-3:], axis=0)
+            clipper.update(corners[0], corners[1])
+
+    def memory_usage(self):
+        """Return the memory held by the in-memory caches, see MemoryBudget.usage.
+
+        :return: total bytes, budget and bytes per cache and per layer id
+        :rtype: Dict[str, Any]
+        """
+        return self.memory.usage()
+
+    def set_memory_budget(self, budget_bytes: int):
+        """Set the memory budget of all in-memory caches, evicts cache items if it is exceeded.
+
+        :param budget_bytes: maximal number of bytes held by all caches
+        :type budget_bytes: int
+        """
+        self.memory.set_budget(budget_bytes)
+
+    def get_clip_slices(self, layer) -> Tuple:
+        """Return the index of the clipped sub-volume of a managed layer.
+        The spatial axes are cut to the clip box, rounded outward to whole voxels. Axes with a disabled slider span the
+        full layer. Leading (non-spatial) axes are indexed at the current viewer position.
+
+        :param layer: managed napari layer
+        :type layer: napari.layers.Layer
+        :return: one integer or slice per layer dimension
+        :rtype: Tuple
+        """
+        shape = np.asarray(self._layer_full_data(layer).shape)
+        if self.world_box:
+            lower, upper = self.get_world_box()
+            corners = np.array(np.meshgrid(*zip(lower, upper), indexing='ij')).reshape(3, -1).T
+            padded = np.zeros((len(corners), layer.ndim))
+            padded[:, -3:] = corners
+            corners = np.asarray(layer._transforms[1:].simplified.inverse(padded))[:, -3:]
+            lower, upper = corners.min(axis=0), corners.max(axis=0)
+        else:
+            lower = np.zeros(3)
+            upper = shape[-3:].astype(float)
+            for key, (_, axis) in self.ref.items():
+                if self.sliders[key].state:
+                    lower[axis], upper[axis] = self._layer_axis_range(layer, key, self.sliders[key].value)
+        lower = np.clip(np.floor(lower), 0, shape[-3:]).astype(int)
+        upper = np.clip(np.ceil(upper), lower, shape[-3:]).astype(int)
+        leading = np.asarray(layer.world_to_data(self.viewer.dims.point))[:layer.ndim - 3]
+        leading = np.clip(np.round(leading), 0, shape[:-3] - 1).astype(int)
+        return tuple(int(i) for i in leading) + tuple(slice(int(lo), int(hi)) for lo, hi in zip(lower, upper))
+
+    def register_analysis(self, name: str, fn: Callable, **kwargs):
+        """Register a named analysis function, e.g. to run it from the dock widget.
+
+        :param name: function name
+        :type name: str
+        :param fn: picklable function, see run_analysis
+        :type fn: Callable
+        :param kwargs: default keyword arguments of run_analysis for this function, e.g. output='labels'
+        :type kwargs: Dict
+        """
+        self.analysis_functions[name] = (fn, kwargs)
+
+    def run_analysis(self, fn: Union[Callable, str], layers: Optional[List] = None, output: Optional[str] = None,
+                     output_dtype=None, max_tiles: Optional[int] = None, tile_bytes: Optional[int] = None,
+                     memmap_dir: Optional[str] = None, name: Optional[str] = None,
+                     progress: Optional[Callable[[int, int], None]] = None) -> List[AnalysisJob]:
+        """Run an analysis function on the clipped sub-volume of layers on the process pool of the scheduler.
+        The sub-volume is streamed tile by tile into shared memory and processed by worker processes, see AnalysisJob.
+        All jobs share the worker processes of the scheduler.
+        Each result is added to the viewer as a new layer at the world position of the clipped sub-volume. Arguments
+        that are not None override the defaults of a registered function.
+
+        :param fn: picklable function or the name of a registered function, receives a tile of the sub-volume and
+            returns an array of the tile shape (image, labels output) or (N, 3) coordinates (points output)
+        :type fn: Union[Callable, str]
+        :param layers: managed layers to analyze, default: None (the selected managed layers)
+        :type layers: Optional[List]
+        :param output: result layer type, one of 'image', 'labels' or 'points', default: None ('image')
+        :type output: Optional[str]
+        :param output_dtype: dtype of array outputs, default: None (input dtype, int32 for labels)
+        :type output_dtype: np.dtype
+        :param max_tiles: maximal number of tiles in flight per layer, default: None (number of worker processes)
+        :type max_tiles: Optional[int]
+        :param tile_bytes: targeted bytes per tile, default: None (64 MiB)
+        :type tile_bytes: Optional[int]
+        :param memmap_dir: directory for memory-mapped buffers instead of shared memory, default: None
+        :type memmap_dir: Optional[str]
+        :param name: name prefix of the result layers, default: None (function name)
+        :type name: Optional[str]
+        :param progress: called with (finished tiles, total tiles) over all started jobs, default: None
+        :type progress: Optional[Callable[[int, int], None]]
+        :return: started jobs, one per layer
+        :rtype: List[AnalysisJob]
+        """
+        if isinstance(fn, str):
+            fn, defaults = self.analysis_functions[fn]
+            kwargs = dict(defaults)
+            passed = dict(
+                output=output, output_dtype=output_dtype, max_tiles=max_tiles, tile_bytes=tile_bytes,
+                memmap_dir=memmap_dir, name=name
+            )
+            kwargs.update({key: value for key, value in passed.items() if value is not None})
+            return self.run_analysis(fn, layers, progress=progress, **kwargs)
+        managed = self._managed_layers()
+        if layers is None:
+            layers = [layer for layer in managed if layer in self.viewer.layers.selection]
+        name = name or getattr(fn, '__name__', 'analysis')
+        tiles = {}
+        jobs = []
+        for layer in layers:
+            if layer not in managed:
+                continue
+            data = self._layer_full_data(layer)
+            slices = self.get_clip_slices(layer)
+            job = AnalysisJob(
+                fn, data, slices, output or 'image', output_dtype, max_tiles, tile_bytes or TILE_BYTES, memmap_dir
+            )
+
+            def job_progress(done, total, key=id(job)):
+                tiles[key] = (done, total)
+                if progress is not None:
+                    progress(sum(d for d, _ in tiles.values()), sum(t for _, t in tiles.values()))
+            job.progress.connect(job_progress)
+            job.finished.connect(
+                lambda result, job=job, layer=layer, slices=slices: self._add_analysis_result(
+                    job, layer, slices, result, name
+                )
+            )
+            job.failed.connect(lambda message, job=job: self._analysis_failed(job, message))
+            self.analysis_jobs.append(job)
+            job.start(self.scheduler)
+            jobs.append(job)
+        return jobs
+
+    def cancel_analysis(self):
+        """Cancel all running analysis jobs, queued tiles are dropped and running tiles finish.
+        """
+        for job in self.analysis_jobs:
+            job.cancel()
+        self.analysis_jobs = []
+
+    def _add_analysis_result(self, job: AnalysisJob, layer, slices: Tuple, result: np.ndarray, name: str):
+        """Add the result of an analysis job to the viewer, placed at the clipped sub-volume of the analyzed layer.
+        The layer is assumed to be axis aligned, so its scale and the world position of the sub-volume origin place
+        the result.
+        """
+        if job in self.analysis_jobs:
+            self.analysis_jobs.remove(job)
+        spatial = slices[-3:]
+        offset = np.zeros(layer.ndim)
+        offset[:len(slices) - 3] = slices[:-3]
+        offset[-3:] = [s.start for s in spatial]
+        translate = np.asarray(layer._transforms[1:].simplified(offset[None]))[0, -3:]
+        kwargs = dict(name=f'{name} {layer.name}', scale=np.asarray(layer.scale)[-3:], translate=translate)
+        if job.output == 'points':
+            self.viewer.add_points(result, **kwargs)
+        elif job.output == 'labels':
+            self.viewer.add_labels(result, **kwargs)
+        else:
+            self.viewer.add_image(result, **kwargs)
+
+    def _analysis_failed(self, job: AnalysisJob, message: str):
+        """Drop a failed analysis job and report the error.
+        """
+        if job in self.analysis_jobs:
+            self.analysis_jobs.remove(job)
+        show_error(f'analysis failed: {message}')
+
+    def _layer_full_data(self, layer):
+        """Return the full resolution data of a layer, also while a LOD proxy is shown.
+
+        :param layer: napari layer
+        :type layer: napari.layers.Layer
+        :return: layer data, the first level of multiscale data
+        :rtype: array like
+        """
+        data = self._lod_originals.get(id(layer), (layer, layer.data))[1]
+        return data[0] if layer.multiscale else data
+
+    def _layer_axis_range(self, layer, key: str, crange) -> np.ndarray:
+        """Return the data coordinates of the two clipping planes of one axis, snapped to the storage chunk grid of
+        the layer if chunk_snap is set. Positions held by the 'absolute' resize policy replace the lookup table of the
+        layer until the slider of the axis is moved.
+
+        :param layer: managed napari layer
+        :type layer: napari.layers.Layer
+        :param key: axis name (x, y, z)
+        :type key: str
+        :param crange: slider ticks of the "lower" and "upper" clipping plane
+        :type crange: Tuple[int, int]
+        :return: lower and upper plane coordinate
+        :rtype: np.ndarray
+        """
+        ticks, held = self._held_ranges.get(id(layer), {}).get(key, (None, None))
+        if ticks == tuple(int(tick) for tick in crange):
+            bounds = held
+        else:
+            bounds = layer.metadata['cp_spacing'][key][list(crange)]
+        if self.chunk_snap is None:
+            return bounds
+        grid = chunk_boundaries(self._layer_full_data(layer))
+        if grid is None:
+            return bounds
+        return np.array(snap_range(*bounds, grid[len(grid) - 3 + self.ref[key][1]], self.chunk_snap))
+
+    def set_chunk_snap(self, mode: Optional[str]):
+        """Snap the box edges of chunked (zarr, dask) layers to their storage chunk grid.
+        Outward snapping grows the box to whole chunks, so every chunk that is read is used completely. Inward
+        snapping shrinks the box to the chunks it fully contains. The slider ticks stay unchanged, only the plane
+        positions of each layer are snapped to its own chunk grid. The world space box is not snapped.
+
+        :param mode: 'outward', 'inward' or None to switch snapping off
+        :type mode: Optional[str]
+        """
+        if mode not in SNAP_MODES:
+            raise ValueError(f'chunk_snap must be one of {SNAP_MODES}, not {mode}')
+        self.chunk_snap = mode
+        self._drop_preset_planes()
+        if not self.world_box:
+            for name, slider in self.sliders.items():
+                self.slider_value_changed(name, slider.value)
+
+    def estimate_io(self, layers: Optional[List] = None) -> Dict[str, Any]:
+        """Estimate the storage chunks and bytes the current clip box reads from chunked layers.
+        Only metadata (shape, chunks, dtype) is used, see get_clip_slices for the clipped index of a layer.
+
+        :param layers: layers to estimate, default: None (all managed layers)
+        :type layers: Optional[List]
+        :return: total chunks and bytes and the same per layer id, unchunked layers are skipped
+        :rtype: Dict[str, Any]
+        """
+        per_layer = {}
+        for layer in self._managed_layers() if layers is None else layers:
+            data = self._layer_full_data(layer)
+            grid = chunk_boundaries(data)
+            if grid is None:
+                continue
+            chunks, nbytes = estimate_io(grid, self.get_clip_slices(layer), np.dtype(data.dtype).itemsize)
+            per_layer[id(layer)] = dict(chunks=chunks, nbytes=nbytes)
+        return dict(
+            chunks=sum(v['chunks'] for v in per_layer.values()),
+            nbytes=sum(v['nbytes'] for v in per_layer.values()),
+            layers=per_layer,
+        )
@@ -20,9 +20,11 @@ class ClippingSliderWidget(QWidget):
     Class attributes:
         - state_emitter: signal emitter for state_change events
         - value_emitter: signal emitter for state_change events
+        - drag_emitter: signal emitter for slider press (True) and release (False) events
     """
     state_emitter = Signal([str, bool])
     value_emitter = Signal([str, tuple])
+    drag_emitter = Signal([str, bool])
 
     def __init__(self, name: str, state: bool = False, srange: Tuple[int, int] = (0, 100), value: Tuple[int, int] = (0, 100)):
         """Initialise instance.
@@ -54,6 +56,8 @@ class ClippingSliderWidget(QWidget):
 
         self.active_check.stateChanged.connect(self.state_changed)
         self.rangeslider.valueChanged.connect(self.value_changed)
+        self.rangeslider.sliderPressed.connect(self.drag_started)
+        self.rangeslider.sliderReleased.connect(self.drag_finished)
 
         layout = QHBoxLayout()
         layout.addWidget(self.active_check)
@@ -89,6 +93,26 @@ class ClippingSliderWidget(QWidget):
         """
         self.rangeslider.setValue(value)
 
+    def set_silent(self, state: bool, value: Tuple[int, int]):
+        """Set state and value without emitting any signal.
+        Used by controllers that already applied the new state and value themselves, e.g. for presets.
+
+        :param state: new state (True / False)
+        :type state: bool
+        :param value: new value tuple (lower, upper)
+        :type value: Tuple[int, int]
+        """
+        self.active_check.blockSignals(True)
+        self.rangeslider.blockSignals(True)
+        try:
+            self.active_check.setChecked(state)
+            self.rangeslider.setValue(value)
+        finally:
+            self.active_check.blockSignals(False)
+            self.rangeslider.blockSignals(False)
+        self.state = self.get_state()
+        self.value = self.get_value()
+
     def get_value(self) -> Tuple[Any, ...]:
         """Return the current value.
         Extracts the current value from the underlying QRangeSlider.
@@ -135,3 +159,19 @@ class ClippingSliderWidget(QWidget):
         """
         self.value = self.get_value()
         return self.value_emitter.emit(self.name, self.value)
+
+    def drag_started(self):
+        """Emit drag_changed signal for a pressed slider handle.
+
+        :return: name of the instance and True
+        :rtype: Tuple[str, bool]
+        """
+        return self.drag_emitter.emit(self.name, True)
+
+    def drag_finished(self):
+        """Emit drag_changed signal for a released slider handle.
+
+        :return: name of the instance and False
+        :rtype: Tuple[str, bool]
+        """
+        return self.drag_emitter.emit(self.name, False)